@@ -0,0 +1,29 @@
+"""Compare the parser backends on the same pubmed files
+
+    python benchmarks/bench_backends.py pubmed25n0001.xml.gz [pubmed25n0002.xml.gz ...]
+
+Every backend must produce the same dataframe as the first one
+"""
+import sys
+import time
+
+import polars as pl
+
+from pub2csv.parser import BACKENDS, xml_to_df
+
+
+if __name__ == "__main__":
+
+    file_list = sys.argv[1:]
+    if not file_list:
+        sys.exit(__doc__)
+
+    reference = None
+    for backend in BACKENDS:
+        start = time.perf_counter()
+        df = pl.concat([xml_to_df(file_path, backend=backend) for file_path in file_list])
+        elapsed = time.perf_counter() - start
+
+        if reference is None:
+            reference = df
+        print(f"{backend:<6} : {df.height} articles in {elapsed:.2f}s ({df.height / elapsed:.0f} articles/s), identical : {df.equals(reference)}")
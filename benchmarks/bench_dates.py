@@ -0,0 +1,98 @@
+"""Compare the vectorized date normalization with the original row-wise one
+
+    python benchmarks/bench_dates.py [n_dates]
+
+Dates are drawn from the forms the original function handles correctly
+(month names, seasons, optional day), numeric months and MedlineDate
+ranges are intentional differences, see tests/test_dates.py
+"""
+import random
+import re
+import sys
+import time
+
+import polars as pl
+
+from pub2csv.parser import normalize_date_expr
+
+
+def normalize_pubdate_split(date_str:str) -> str | None:
+    """Copy of the original split based normalize_pubdate"""
+    if not date_str:
+        return None
+
+    # params
+    month_map = {
+        "jan": "01",
+        "feb": "02",
+        "mar": "03",
+        "apr": "04",
+        "may": "05",
+        "jun": "06",
+        "jul": "07",
+        "aug": "08",
+        "sep": "09",
+        "sept": "09",
+        "oct": "10",
+        "nov": "11",
+        "dec": "12"
+    }
+
+    # capture année, mois, jour éventuel
+    parts = re.split(r"[- ]", date_str.strip())
+    if len(parts) == 1:
+        # cas: juste l'année
+        year = parts[0]
+        return f"{year}-01-01"
+    elif len(parts) == 2:
+        # cas: année + mois
+        year, month = parts
+        month_num = month_map.get(month.lower(), "01")
+        return f"{year}-{month_num}-01"
+    elif len(parts) >= 3:
+        # cas: année + mois + jour
+        year, month, day = parts[:3]
+        month_num = month_map.get(month.lower(), "01")
+        # pad le jour à 2 chiffres
+        day = day.zfill(2)
+        return f"{year}-{month_num}-{day}"
+    return None
+
+
+def random_dates(n:int, seed:int=0) -> list:
+    """Raw pubmed-like dates, e.g 2025-Sep-14, 2019 Spring, 2018"""
+    rng = random.Random(seed)
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec", "sept", "Spring", None]
+    dates = []
+    for _ in range(n):
+        parts = [str(rng.randint(1950, 2025))]
+        month = rng.choice(months)
+        if month:
+            parts.append(month)
+            if rng.random() < 0.7:
+                parts.append(str(rng.randint(1, 28)))
+        dates.append(rng.choice(["-", " "]).join(parts))
+    return dates
+
+
+if __name__ == "__main__":
+
+    n_dates = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    df = pl.DataFrame({"PublicationDate": random_dates(n_dates)})
+
+    start = time.perf_counter()
+    rowwise = df.select(
+        pl.col("PublicationDate")
+        .map_elements(normalize_pubdate_split, return_dtype=pl.Utf8)
+        .str.strptime(pl.Date, "%Y-%m-%d", strict=False)
+    )
+    rowwise_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorized = df.select(normalize_date_expr("PublicationDate"))
+    vectorized_time = time.perf_counter() - start
+
+    print(f"{n_dates} dates")
+    print(f"row-wise   : {rowwise_time:.2f}s")
+    print(f"vectorized : {vectorized_time:.2f}s ({rowwise_time / vectorized_time:.1f}x)")
+    print(f"identical  : {rowwise.equals(vectorized)}")
@@ -0,0 +1,66 @@
+"""Compare the one pass multi-term filter_keyword with a loop of single term calls
+
+    python benchmarks/bench_keywords.py [n_articles] [n_terms]
+"""
+import random
+import sys
+import time
+
+import polars as pl
+
+from pub2csv.filter import filter_keyword
+
+
+def random_articles(n:int, vocabulary:list, seed:int=0) -> pl.DataFrame:
+    """Synthetic articles, 12 word titles, 200 word abstracts and 4 keywords"""
+    rng = random.Random(seed)
+    return pl.DataFrame({
+        "PMID": [str(i) for i in range(n)],
+        "Title": [" ".join(rng.choices(vocabulary, k=12)).capitalize() for _ in range(n)],
+        "Abstract": [" ".join(rng.choices(vocabulary, k=200)) for _ in range(n)],
+        "Keywords": ["; ".join(rng.choices(vocabulary, k=4)) for _ in range(n)],
+    })
+
+
+def loop_of_calls(df:pl.DataFrame, terms:list, ignore_case:bool, whole_word:bool) -> set:
+    """PMID matched by one filter_keyword call per term"""
+    pmids = set()
+    for term in terms:
+        pattern = pl.escape_regex(term)
+        if whole_word:
+            pattern = rf"\b{pattern}\b"
+        if ignore_case:
+            pattern = f"(?i){pattern}"
+        pmids.update(filter_keyword(df, pattern)["PMID"])
+    return pmids
+
+
+if __name__ == "__main__":
+
+    n_articles = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    n_terms = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+
+    # common words fill the text, the searched terms are rare
+    rng = random.Random(1)
+    common = [f"word{i}" for i in range(5000)]
+    terms = [f"term{i}" for i in range(n_terms)]
+    df = random_articles(n_articles, common + rng.sample(terms + [t.upper() for t in terms], k=min(2 * n_terms, 200)))
+
+    print(f"{n_articles} articles, {n_terms} terms")
+    for ignore_case, whole_word in [(False, False), (True, True)]:
+        start = time.perf_counter()
+        expected = loop_of_calls(df, terms, ignore_case, whole_word)
+        loop_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = set(filter_keyword(df, terms, ignore_case, whole_word)["PMID"])
+        one_pass_time = time.perf_counter() - start
+
+        print(f"ignore_case={ignore_case} whole_word={whole_word}")
+        print(f"    loop of calls : {loop_time:.2f}s")
+        print(f"    one pass      : {one_pass_time:.2f}s ({loop_time / one_pass_time:.1f}x)")
+        print(f"    matches       : {len(found)}, identical : {found == expected}")
+
+    start = time.perf_counter()
+    filter_keyword(df, terms, return_matches=True)
+    print(f"with MatchedTerms : {time.perf_counter() - start:.2f}s")
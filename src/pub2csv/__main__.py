@@ -0,0 +1,39 @@
+import argparse
+import os
+
+from .batch import convert_files
+
+
+def main() -> None:
+    """Command line entry point, run with python -m pub2csv"""
+
+    parser = argparse.ArgumentParser(prog="pub2csv", description="Download and convert pubmed xml data")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    # convert
+    convert = subparsers.add_parser("convert", help="convert xml.gz files (or folders of xml.gz files) to parquet / csv")
+    convert.add_argument("inputs", nargs="+", help="xml.gz files or folders containing xml.gz files")
+    convert.add_argument("-o", "--output-folder", required=True, help="folder where converted files are written")
+    convert.add_argument("-f", "--format", choices=["parquet", "csv"], default="parquet", help="output format")
+    convert.add_argument("-w", "--workers", type=int, default=None, help="number of processes, default to the number of cpu")
+    convert.add_argument("--drop", action="store_true", help="delete xml.gz and md5 files once converted")
+    convert.add_argument("--override", action="store_true", help="convert files even if their output already exist")
+
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        file_list = []
+        for target in args.inputs:
+            if os.path.isdir(target):
+                file_list += sorted(
+                    os.path.join(target, f) for f in os.listdir(target) if f.endswith(".xml.gz")
+                )
+            else:
+                file_list.append(target)
+        report = convert_files(file_list, args.output_folder, args.format, args.workers, args.drop, args.override)
+        if report["failed"]:
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
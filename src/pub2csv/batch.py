@@ -0,0 +1,133 @@
+import glob
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+
+from .parser import xml_to_parquet, xml_to_csv
+
+
+def get_output_file(pubmed_file:str, output_folder:str, output_format:str) -> str:
+    """Craft the path of the converted file associated to a pubmed xml.gz file
+
+    Args:
+        - pubmed_file (str) : path to the pubmedxxxx.xml.gz file
+        - output_folder (str) : folder where converted files are written
+        - output_format (str) : either parquet or csv
+
+    Returns:
+        - (str) : path to the converted file
+    
+    """
+    file_name = os.path.basename(pubmed_file).replace(".xml.gz", f".{output_format}")
+    return f"{output_folder}/{file_name}"
+
+
+def convert_file(pubmed_file:str, output_file:str, output_format:str, drop:bool) -> str:
+    """Convert a single xml.gz file, writing to a temporary file first so that
+    an interrupted conversion never leaves a truncated output behind
+
+    Args:
+        - pubmed_file (str) : xml.gz file containing data
+        - output_file (str) : path to save the converted file
+        - output_format (str) : either parquet or csv
+        - drop (bool) : if set to True delete xml.gz and md5 file once converted
+
+    Returns:
+        - (str) : path to the converted file
+    
+    """
+
+    tmp_file = f"{output_file}.tmp"
+    try:
+        if output_format == "parquet":
+            xml_to_parquet(pubmed_file, tmp_file, drop)
+        elif output_format == "csv":
+            xml_to_csv(pubmed_file, tmp_file, drop)
+        else:
+            raise ValueError(f"Unknown output format {output_format}, should be parquet or csv")
+    except:
+        if os.path.isfile(tmp_file):
+            os.remove(tmp_file)
+        raise
+    os.replace(tmp_file, output_file)
+
+    return output_file
+
+
+def convert_files(file_list:list, output_folder:str, output_format:str="parquet", workers:int=None, drop:bool=False, override:bool=False) -> dict:
+    """Convert a list of xml.gz files using a pool of processes
+    A file that fails to convert is reported and does not stop the others
+
+    Args:
+        - file_list (list) : list of xml.gz files to convert
+        - output_folder (str) : folder where converted files are written
+        - output_format (str) : either parquet or csv
+        - workers (int) : number of processes to use, default to the number of cpu
+        - drop (bool) : if set to True delete xml.gz and md5 file once converted
+        - override (bool) : if set to False, skip files whose output already exist
+
+    Returns:
+        - (dict) : converted, skipped and failed files (failed maps file to error message)
+    
+    """
+
+    # init output folder
+    if not os.path.isdir(output_folder):
+        os.makedirs(output_folder)
+
+    # select files to convert
+    report = {"converted": [], "skipped": [], "failed": {}}
+    to_convert = []
+    for pubmed_file in file_list:
+        if not override and os.path.isfile(get_output_file(pubmed_file, output_folder, output_format)):
+            report["skipped"].append(pubmed_file)
+        else:
+            to_convert.append(pubmed_file)
+
+    # run conversion, workers are spawned as forking a process already running polars can deadlock them
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        futures = {
+            executor.submit(convert_file, pubmed_file, get_output_file(pubmed_file, output_folder, output_format), output_format, drop): pubmed_file
+            for pubmed_file in to_convert
+        }
+        progress = tqdm(as_completed(futures), total=len(futures), desc="Converting files")
+        for future in progress:
+            pubmed_file = futures[future]
+            try:
+                future.result()
+                report["converted"].append(pubmed_file)
+            except Exception as e:
+                report["failed"][pubmed_file] = str(e)
+                tqdm.write(f"[!] Failed to convert {pubmed_file} : {e}")
+            progress.set_postfix(failed=len(report["failed"]))
+
+    # display summary
+    print(f"[*] Converted {len(report['converted'])} files, skipped {len(report['skipped'])}, failed {len(report['failed'])}")
+
+    return report
+
+
+def convert_folder(input_folder:str, output_folder:str, output_format:str="parquet", workers:int=None, drop:bool=False, override:bool=False) -> dict:
+    """Convert all xml.gz files present in a folder using a pool of processes
+
+    Args:
+        - input_folder (str) : folder containing pubmedxxxx.xml.gz files
+        - output_folder (str) : folder where converted files are written
+        - output_format (str) : either parquet or csv
+        - workers (int) : number of processes to use, default to the number of cpu
+        - drop (bool) : if set to True delete xml.gz and md5 file once converted
+        - override (bool) : if set to False, skip files whose output already exist
+
+    Returns:
+        - (dict) : converted, skipped and failed files (failed maps file to error message)
+    
+    """
+    file_list = sorted(glob.glob(f"{input_folder}/*.xml.gz"))
+    return convert_files(file_list, output_folder, output_format, workers, drop, override)
+
+
+if __name__ == "__main__":
+
+    m = convert_folder("/tmp/pubfetch", "/tmp/pubfetch_parquet", "parquet", 4, False, False)
+    print(m)
@@ -1,18 +1,28 @@
-from ftplib import FTP
+from ftplib import FTP, error_perm
 import os
 from tqdm import tqdm
 import glob
 from datetime import datetime
 import hashlib
+import json
 import shutil
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 
-def get_ftp_connection(ncbi_server_address, target_folder) -> FTP:
+# size of the blocks requested to retrbinary, in bytes
+BLOCK_SIZE = 1024 * 1024
+
+
+def get_ftp_connection(ncbi_server_address, target_folder, port:int=21) -> FTP:
     """get ftp connection to NCBI
 
     Args:
         - ncbi_server_address (str) : ftp adress of ncbi server
         - pubmed_emplacement (str) : place where files are stored on the ftp server
+        - port (int) : ftp port of the server, e.g to use a local mirror
 
     Returns:
         - (FTP) : connection to the server
@@ -21,7 +31,8 @@ def get_ftp_connection(ncbi_server_address, target_folder) -> FTP:
 
     # connect to the NCBI server
     target_files = []
-    ftp = FTP(ncbi_server_address)
+    ftp = FTP()
+    ftp.connect(ncbi_server_address, port)
     ftp.login(user="", passwd="")
 
     # navigate to the pubmed directory
@@ -29,48 +40,142 @@ def get_ftp_connection(ncbi_server_address, target_folder) -> FTP:
 
     return ftp
 
-def get_file_list_to_modif_date(ncbi_server_address:str, pubmed_emplacement:str) -> dict:
-    """Conncect to the NCBI server and return a list of available gz files and their date of last modification
+def parse_list_line(line:str, now:datetime=None) -> tuple:
+    """Parse a unix style LIST line, e.g
+    -r--r--r--   1 ftp      anonymous 36422478 Dec 13  2024 pubmed25n0001.xml.gz
+    -r--r--r--   1 ftp      anonymous 11246718 Sep 14 14:05 pubmed25n1492.xml.gz
 
     Args:
-        - ncbi_server_address (str) : ftp adress of ncbi server
-        - pubmed_emplacement (str) : place where files are stored on the ftp server
+        - line (str) : line returned by the LIST command
+        - now (datetime) : reference date, used when the year is replaced by the time
 
     Returns:
-        - (dict) : target file to their last modification date
-       
+        - (tuple) : (file name, size, modification date) or None if the line can't be parsed
+    
     """
 
-    # connect to the NCBI server
-    target_files = []
-    ftp = FTP(ncbi_server_address)
-    ftp.login(user="", passwd="")
+    parts = line.split(None, 8)
+    if len(parts) < 9 or parts[0].startswith("d"):
+        return None
 
-    # navigate to the pubmed directory
-    ftp.cwd(pubmed_emplacement)
+    # date is either "Mon DD YYYY" or "Mon DD HH:MM" for the last 6 months
+    month, day, year_or_time = parts[5], parts[6], parts[7]
+    try:
+        if ":" in year_or_time:
+            now = now or datetime.now()
+            modified = datetime.strptime(f"{month} {day} {now.year} {year_or_time}", "%b %d %Y %H:%M")
+            if modified > now:
+                modified = modified.replace(year=now.year - 1)
+        else:
+            modified = datetime.strptime(f"{month} {day} {year_or_time}", "%b %d %Y")
+        size = int(parts[4])
+    except ValueError:
+        return None
 
-    # list files present in the ftp folder
+    return parts[8], size, modified
+
+
+def list_remote_files(ftp_connection:FTP) -> dict:
+    """List files of the current ftp folder with their size and last modification
+    date in a single round trip, using MLSD if the server supports it and LIST otherwise
+
+    Args:
+        - ftp_connection (FTP) : connection to ncbi server
+
+    Returns:
+        - (dict) : file name to {"size":int, "modified":datetime}
+    
+    """
+
+    files = {}
     try:
-        files = ftp.nlst()
-    except:
-        print("[*] No files to list or connection denied")
+        for name, facts in ftp_connection.mlsd(facts=["type", "size", "modify"]):
+            if facts.get("type") != "file":
+                continue
+            files[name] = {
+                "size": int(facts["size"]),
+                "modified": datetime.strptime(facts["modify"][:14], "%Y%m%d%H%M%S")
+            }
+    except error_perm:
+        lines = []
+        ftp_connection.retrlines("LIST", lines.append)
+        for line in lines:
+            entry = parse_list_line(line)
+            if entry is not None:
+                name, size, modified = entry
+                files[name] = {"size": size, "modified": modified}
+
+    return files
+
+
+def get_remote_manifest(ncbi_server_address:str, pubmed_emplacement:str, cache_file:str=None, ttl:int=3600) -> dict:
+    """Return size, last modification date and md5 availability of every gz file of
+    a ftp folder. If cache_file is provided, the manifest is saved there and reused
+    without contacting the server while it is younger than ttl seconds
 
-    # prepare list of gz file to download
-    file_to_date = {}
-    for elt in files:
-        elt_str = elt.split(".")
-        if elt_str[-1] == "gz":
-            target_files.append(elt)
-            resp = ftp.sendcmd(f"MDTM {elt}")
-            print(elt)
-            print(resp)
-            print("-"*45)
-            d = resp.split(' ')[1]
-            d = datetime.strptime(d, "%Y%m%d%H%M%S")
-            file_to_date[elt] = d
+    Args:
+        - ncbi_server_address (str) : ftp adress of ncbi server
+        - pubmed_emplacement (str) : place where files are stored on the ftp server
+        - cache_file (str) : path to the local json manifest
+        - ttl (int) : validity of the cached manifest, in seconds
 
-    # return list of files
-    return file_to_date
+    Returns:
+        - (dict) : gz file name to {"size":int, "modified":datetime, "md5":bool}
+    
+    """
+
+    # use cached manifest if still valid
+    if cache_file and os.path.isfile(cache_file) and time.time() - os.path.getmtime(cache_file) < ttl:
+        with open(cache_file) as f:
+            cache = json.load(f)
+        if cache.get("server") == ncbi_server_address and cache.get("folder") == pubmed_emplacement:
+            manifest = cache["files"]
+            for infos in manifest.values():
+                infos["modified"] = datetime.fromisoformat(infos["modified"])
+            return manifest
+
+    # list remote folder
+    ftp = get_ftp_connection(ncbi_server_address, pubmed_emplacement)
+    files = list_remote_files(ftp)
+    ftp.close()
+
+    # keep gz files
+    manifest = {}
+    for name, infos in files.items():
+        if name.endswith(".gz"):
+            manifest[name] = {"size": infos["size"], "modified": infos["modified"], "md5": f"{name}.md5" in files}
+
+    # save cache
+    if cache_file:
+        cache = {
+            "server": ncbi_server_address,
+            "folder": pubmed_emplacement,
+            "files": {name: dict(infos, modified=infos["modified"].isoformat()) for name, infos in manifest.items()}
+        }
+        tmp_file = f"{cache_file}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_file, cache_file)
+
+    return manifest
+
+
+def get_file_list_to_modif_date(ncbi_server_address:str, pubmed_emplacement:str, cache_file:str=None, ttl:int=3600) -> dict:
+    """Conncect to the NCBI server and return a list of available gz files and their date of last modification
+
+    Args:
+        - ncbi_server_address (str) : ftp adress of ncbi server
+        - pubmed_emplacement (str) : place where files are stored on the ftp server
+        - cache_file (str) : path to the local json manifest, see get_remote_manifest
+        - ttl (int) : validity of the cached manifest, in seconds
+
+    Returns:
+        - (dict) : target file to their last modification date
+       
+    """
+
+    manifest = get_remote_manifest(ncbi_server_address, pubmed_emplacement, cache_file, ttl)
+    return {name: infos["modified"] for name, infos in manifest.items()}
 
 
 def get_list_of_pubmed_files(ftp_connection:FTP) -> list:
@@ -128,13 +233,54 @@ def get_files_between_date(file_to_date:dict, date_min:str, date_max:str):
             
     return target_file
 
-def download_file_list(file_list:list, ftp:FTP, download_folder:str) -> None:
+def retrieve_file(ftp_connection:FTP, file_name:str, local_file:str, block_size:int=BLOCK_SIZE, hasher=None) -> None:
+    """Download file_name into local_file, resuming with REST from the bytes
+    already present in local_file if a previous transfer was interrupted
+
+    Args:
+        - ftp_connection (FTP) : connection to ncbi server
+        - file_name (str) : name of the file on the server
+        - local_file (str) : path of the (partial) local file
+        - block_size (int) : size of the blocks read from the connection, in bytes
+        - hasher (hashlib hash) : if provided, updated with every byte of the file while it is written
+    
+    """
+
+    # look for an interrupted transfer
+    offset = os.path.getsize(local_file) if os.path.isfile(local_file) else 0
+    if offset:
+        ftp_connection.voidcmd("TYPE I")
+        remote_size = ftp_connection.size(file_name)
+        if remote_size is not None and offset > remote_size:
+            offset = 0
+
+    # bytes received by a previous transfer are hashed from disk
+    if offset and hasher is not None:
+        with open(local_file, "rb") as f:
+            for chunk in iter(lambda: f.read(block_size), b""):
+                hasher.update(chunk)
+    if offset and offset == remote_size:
+        return
+
+    # resume (or start) transfer, hashing chunks as they arrive
+    with open(local_file, "ab" if offset else "wb") as f:
+        if hasher is None:
+            callback = f.write
+        else:
+            def callback(chunk:bytes) -> None:
+                f.write(chunk)
+                hasher.update(chunk)
+        ftp_connection.retrbinary("RETR " + str(file_name), callback, block_size, rest=offset or None)
+
+
+def download_file_list(file_list:list, ftp:FTP, download_folder:str, block_size:int=BLOCK_SIZE) -> None:
     """Download a specific list of files from the ncbri to a download folder
 
     Args:
         - file_list (list) : list of file to dl
         - ftp (FTP) : connection to ncbi server
         - download_folder (str) : local download where files are dl
+        - block_size (int) : size of the blocks read from the connection, in bytes
     
     """
 
@@ -145,10 +291,112 @@ def download_file_list(file_list:list, ftp:FTP, download_folder:str) -> None:
     # loop over target list
     for gz_file in file_list:
 
-        # download file
-        gz_local_file = open(download_folder + "/" + str(gz_file), "wb")
-        ftp.retrbinary("RETR " + str(gz_file), gz_local_file.write, 1024)
-        gz_local_file.close()
+        # download file, only visible under its final name once complete
+        part_file = f"{download_folder}/{gz_file}.part"
+        retrieve_file(ftp, gz_file, part_file, block_size)
+        os.replace(part_file, f"{download_folder}/{gz_file}")
+
+
+def connection_worker(ncbi_server_address:str, folder_location:str, download_folder:str, tasks:queue.Queue, max_retries:int, block_size:int, report:dict, lock:threading.Lock, port:int=21) -> None:
+    """Download files pulled from tasks over a dedicated ftp connection
+    A failed transfer closes the connection and the file is retried on a fresh one
+
+    Args:
+        - ncbi_server_address (str) : ftp adress of ncbi server
+        - folder_location (str) : place where files are stored on the ftp server
+        - download_folder (str) : local folder where files are dl
+        - tasks (queue.Queue) : file names to download
+        - max_retries (int) : number of attempts authorized for each file
+        - block_size (int) : size of the blocks read from the connection, in bytes
+        - report (dict) : shared report, updated with downloaded / failed files and transfered bytes
+        - lock (threading.Lock) : lock protecting report
+        - port (int) : ftp port of the server
+    
+    """
+
+    ftp = None
+    while True:
+        try:
+            gz_file = tasks.get_nowait()
+        except queue.Empty:
+            break
+
+        for attempt in range(max_retries):
+            try:
+                if ftp is None:
+                    ftp = get_ftp_connection(ncbi_server_address, folder_location, port)
+                download_file_list([gz_file], ftp, download_folder, block_size)
+                with lock:
+                    report["downloaded"].append(gz_file)
+                    report["bytes"] += os.path.getsize(f"{download_folder}/{gz_file}")
+                break
+            except Exception as e:
+                print(f"[!] Transfer of {gz_file} failed (attempt {attempt+1}/{max_retries}) : {e}")
+
+                # reconnect before the next attempt
+                try:
+                    ftp.close()
+                except:
+                    pass
+                ftp = None
+        else:
+            # give up, drop the partial transfer
+            part_file = f"{download_folder}/{gz_file}.part"
+            if os.path.isfile(part_file):
+                os.remove(part_file)
+            with lock:
+                report["failed"].append(gz_file)
+
+    if ftp is not None:
+        ftp.close()
+
+
+def download_files_parallel(file_list:list, ncbi_server_address:str, folder_location:str, download_folder:str, n_connections:int=4, block_size:int=BLOCK_SIZE, max_retries:int=3, port:int=21) -> dict:
+    """Download a list of files over n_connections parallel ftp connections
+
+    Args:
+        - file_list (list) : list of file to dl
+        - ncbi_server_address (str) : ftp adress of ncbi server
+        - folder_location (str) : place where files are stored on the ftp server
+        - download_folder (str) : local folder where files are dl
+        - n_connections (int) : number of parallel connections, each with its own session
+        - block_size (int) : size of the blocks read from the connections, in bytes
+        - max_retries (int) : number of attempts authorized for each file
+        - port (int) : ftp port of the server, e.g to use a local mirror
+
+    Returns:
+        - (dict) : downloaded and failed files, transfered bytes, elapsed seconds and throughput in MB/s
+    
+    """
+
+    # if dl folder does not exist, create it
+    if not os.path.isdir(download_folder):
+        os.mkdir(download_folder)
+
+    # init tasks
+    tasks = queue.Queue()
+    for gz_file in file_list:
+        tasks.put(gz_file)
+    report = {"downloaded": [], "failed": [], "bytes": 0}
+    lock = threading.Lock()
+
+    # run connections
+    start = time.monotonic()
+    workers = [
+        threading.Thread(target=connection_worker, args=(ncbi_server_address, folder_location, download_folder, tasks, max_retries, block_size, report, lock, port))
+        for _ in range(max(1, min(n_connections, len(file_list))))
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    # aggregate throughput
+    report["seconds"] = time.monotonic() - start
+    report["throughput"] = report["bytes"] / (1024 ** 2) / report["seconds"] if report["seconds"] > 0 else 0.0
+    print(f"[*] Downloaded {len(report['downloaded'])} files ({report['bytes'] / (1024 ** 2):.1f} MB) in {report['seconds']:.1f}s, {report['throughput']:.2f} MB/s")
+
+    return report
     
 
 
@@ -164,67 +412,50 @@ def get_files_metadata(ncbi_server_address:str, pubmed_emplacement:str) -> dict:
     
     """
 
-    # utils
-    month_to_num = {
-        "Jan": "01",
-        "Feb": "02",
-        "Mar": "03",
-        "Apr": "04",
-        "May": "05",
-        "Jun": "06",
-        "Jul": "07",
-        "Aug": "08",
-        "Sep": "09",
-        "Oct": "10",
-        "Nov": "11",
-        "Dec": "12"
-    }
-
     # connect to the NCBI server
-    ftp = FTP(ncbi_server_address)
-    ftp.login(user="", passwd="")
-
-    # navigate to the pubmed directory
-    ftp.cwd(pubmed_emplacement)
+    ftp = get_ftp_connection(ncbi_server_address, pubmed_emplacement)
 
     # extract meta data
     file_to_data = {}
-    lines = []
-    ftp.retrlines("LIST", lines.append)
-    for line in lines:
-
-        # extract infos
-        line = line.split()
-        filename = line[-1] 
-        size = line[4]
-        month = line[5]
-        day = line[6]
-
-        # try to craft date
-        extention = filename.split(".")[-1]
-        if extention in ('md5', 'gz'):
-            year = filename[6:8]
-            year = f"20{year}"
-
-            # cast month to int
-            try:
-                month = month_to_num[month]
-            except:
-                month = None
-        else:
-            year = None
-
-        # assemble update date
-        if None not in [year, month]:
-            update_date = f"{day}/{month}/{year}"
-        else:
-            update_date = None
-        
-        # save info
-        file_to_data[filename] = {"SIZE":size,"UPDATED":update_date}
+    for filename, infos in list_remote_files(ftp).items():
+        file_to_data[filename] = {"SIZE":str(infos["size"]), "UPDATED":infos["modified"].strftime("%d/%m/%Y")}
+    ftp.close()
 
     return file_to_data
 
+
+def read_md5(md5_file:str) -> str:
+    """Read expected hash from a pubmed md5 file, e.g MD5(pubmed25n0001.xml.gz)= 0123abcd
+
+    Args:
+        - md5_file (str) : path to the md5 file
+
+    Returns:
+        - (str) : expected hash
+    
+    """
+    with open(md5_file) as f:
+        return f.read().strip().split()[1]
+
+
+def compute_md5(file_path:str, block_size:int=BLOCK_SIZE) -> str:
+    """Compute md5 hash of a file, reading it by chunks
+
+    Args:
+        - file_path (str) : path to the file
+        - block_size (int) : size of the chunks read from disk, in bytes
+
+    Returns:
+        - (str) : md5 hex digest
+    
+    """
+    hasher = hashlib.md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(block_size), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
 def check_md5(gz_file:str, md5_file:str) -> bool:
     """Compute and compare gz file md5 hash to expected hash
 
@@ -241,8 +472,8 @@ def check_md5(gz_file:str, md5_file:str) -> bool:
     check = True
 
     # compute & load hashes
-    hash_computed = hashlib.md5(open(gz_file, "rb").read()).hexdigest()
-    hash_expected = open(md5_file).read().strip().split()[1]
+    hash_computed = compute_md5(gz_file)
+    hash_expected = read_md5(md5_file)
 
     if hash_computed != hash_expected:
         check = False
@@ -250,13 +481,45 @@ def check_md5(gz_file:str, md5_file:str) -> bool:
     return check
 
 
-def download_pubmed_file(file_name:str, destination_folder:str, ftp_connection:FTP) -> None:
+def check_folder_md5(folder:str, workers:int=4) -> list:
+    """Re-check every xml.gz file of a local mirror against its md5 file, in parallel
+
+    Args:
+        - folder (str) : folder containing xml.gz and xml.gz.md5 files
+        - workers (int) : number of files hashed at the same time
+
+    Returns:
+        - (list) : xml.gz files whose hash does not match (or without md5 file)
+    
+    """
+
+    def is_valid(gz_file:str) -> bool:
+        if not os.path.isfile(f"{gz_file}.md5"):
+            return False
+        return check_md5(gz_file, f"{gz_file}.md5")
+
+    # hashlib releases the GIL on large buffers, threads are enough
+    gz_files = sorted(glob.glob(f"{folder}/*.xml.gz"))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        checks = list(tqdm(executor.map(is_valid, gz_files), total=len(gz_files), desc="Checking md5"))
+
+    return [gz_file for gz_file, check in zip(gz_files, checks) if not check]
+
+
+def download_pubmed_file(file_name:str, destination_folder:str, ftp_connection:FTP, block_size:int=BLOCK_SIZE) -> str:
     """Download a single pubmed xml.gz file and its associated md5 file
+    The xml.gz file is written to file_name.part, resumed if a previous transfer
+    was interrupted, and only renamed by commit_download once verified.
+    Its md5 hash is computed while it is written
     
     Args:
         - file_name (str) : name of the file to download
         - destination_folder (str) : folder to save pubmed file and md5 file
         - ftp_connection (FTP) : connection to ncbi server
+        - block_size (int) : size of the blocks read from the connection, in bytes
+
+    Returns:
+        - (str) : md5 hash of the downloaded file
     
     """
 
@@ -264,16 +527,43 @@ def download_pubmed_file(file_name:str, destination_folder:str, ftp_connection:F
     if not os.path.isdir(destination_folder):
         os.mkdir(destination_folder)
 
-    # download xml.gz file
-    gz_local_file = open(destination_folder + "/" + str(file_name), "wb")
-    ftp_connection.retrbinary("RETR " + str(file_name), gz_local_file.write, 1024)
-    gz_local_file.close()
-
-    # download md5 file
+    # download md5 file first
     md5_local_file = open(destination_folder + "/" + f"{file_name}.md5", "wb")
-    ftp_connection.retrbinary("RETR " + f"{file_name}.md5", md5_local_file.write, 1024)
+    ftp_connection.retrbinary("RETR " + f"{file_name}.md5", md5_local_file.write, block_size)
     md5_local_file.close()
+
+    # download xml.gz file
+    hasher = hashlib.md5()
+    retrieve_file(ftp_connection, file_name, f"{destination_folder}/{file_name}.part", block_size, hasher)
+
+    return hasher.hexdigest()
+    
+
+def commit_download(file_name:str, destination_folder:str, hash_computed:str=None) -> bool:
+    """Check the md5 of a downloaded part file, rename it to its final name if it
+    matches and delete it if not (the next attempt restart from scratch)
+
+    Args:
+        - file_name (str) : name of the downloaded file
+        - destination_folder (str) : folder where pubmed file and md5 file were saved
+        - hash_computed (str) : hash computed during the transfer, if None the part file is hashed from disk
+
+    Returns:
+        - (bool) : True if hash are identical, False if not
     
+    """
+
+    part_file = f"{destination_folder}/{file_name}.part"
+    if hash_computed is None:
+        hash_computed = compute_md5(part_file)
+
+    if hash_computed == read_md5(f"{destination_folder}/{file_name}.md5"):
+        os.replace(part_file, f"{destination_folder}/{file_name}")
+        return True
+
+    os.remove(part_file)
+    return False
+
 
 def download_and_check(file_name:str, destination_folder:str, ftp_connection:FTP) -> bool:
     """Download pubmed xml file and its associate md5 file, perform md5 check, return True if check passed, False if not
@@ -289,10 +579,10 @@ def download_and_check(file_name:str, destination_folder:str, ftp_connection:FTP
     """
 
     # Download
-    download_pubmed_file(file_name, destination_folder, ftp_connection)
+    hash_computed = download_pubmed_file(file_name, destination_folder, ftp_connection)
 
     # check
-    check = check_md5(f"{destination_folder}/{file_name}", f"{destination_folder}/{file_name}.md5")
+    check = commit_download(file_name, destination_folder, hash_computed)
 
     return check
 
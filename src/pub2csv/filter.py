@@ -1,5 +1,9 @@
 import polars as pl
 import datetime as dt
+import glob
+import os
+
+from .mapper import get_files_between_date, get_indexed_files
 
 
 def filter_date(df:pl.DataFrame, date_min:str, date_max:str) -> pl.DataFrame:
@@ -20,18 +24,33 @@ def filter_date(df:pl.DataFrame, date_min:str, date_max:str) -> pl.DataFrame:
     date_max = dt.datetime.strptime(date_max, "%d/%m/%Y").date()
 
     # apply filter
-    df = df.filter((pl.col("PublicationDate") >= date_min) & (pl.col("PublicationDate") <= date_max) )
+    df = df.filter(date_expr(date_min, date_max))
 
     # return df
     return df
 
 
-def filter_keyword(df, target_word):
+def date_expr(date_min:dt.date, date_max:dt.date) -> pl.Expr:
+    """Publication date predicate, None bounds are open"""
+    expr = pl.lit(True)
+    if date_min is not None:
+        expr = expr & (pl.col("PublicationDate") >= date_min)
+    if date_max is not None:
+        expr = expr & (pl.col("PublicationDate") <= date_max)
+    return expr
+
+
+def filter_keyword(df, target_word, ignore_case:bool=False, whole_word:bool=False, return_matches:bool=False):
     """Filter article with targetçwords present either in title, abstract or keywords
+    A list of terms is matched literally in a single pass per column
+    (Aho-Corasick), a str is used as a regular expression
 
     Args:
         - df (pl.DataFrame) : polars dataframe containing article
-        - target_word (str) : word to search
+        - target_word (str | list) : word to search, or list of terms to search at once
+        - ignore_case (bool) : if set to True, case insensitive search (ascii only for a list of terms without whole_word)
+        - whole_word (bool) : if set to True, only match whole words
+        - return_matches (bool) : if set to True, add a MatchedTerms column listing the terms found in each article
 
     Returns:
         - (pl.DataFrame) : filtered dataframe
@@ -39,15 +58,281 @@ def filter_keyword(df, target_word):
     """
 
     # perform filter
-    df = df.filter(
-        (pl.col("Title").str.contains(target_word, literal=False)) |
-        (pl.col("Abstract").str.contains(target_word, literal=False)) |
-        (pl.col("Keywords").str.contains(target_word, literal=False))
-    )
+    df = df.filter(keyword_expr(df.schema, target_word, ignore_case, whole_word))
+
+    # list found terms
+    if return_matches:
+        df = df.with_columns(matched_terms_expr(df.schema, target_word, ignore_case, whole_word).alias("MatchedTerms"))
 
     return df
 
 
+def keyword_columns(schema:pl.Schema) -> list:
+    """Title, Abstract and Keywords expressions searched by filter_keyword"""
+
+    # list typed keywords (list_columns=True) are searched on their joined form
+    keywords = pl.col("Keywords")
+    if schema["Keywords"] == pl.List(pl.Utf8):
+        keywords = keywords.list.join("; ")
+
+    return [pl.col("Title"), pl.col("Abstract"), keywords]
+
+
+def get_terms(target_word:list) -> list:
+    """Distinct non empty terms of a term list, an empty list would match every article
+
+    Args:
+        - target_word (list) : terms to search
+
+    Returns:
+        - (list) : distinct terms, in their original order
+    
+    """
+    terms = [term for term in dict.fromkeys(target_word) if term]
+    if not terms:
+        raise ValueError("No term to search, target_word is empty")
+    return terms
+
+
+def keyword_pattern(target_word, ignore_case:bool=False, whole_word:bool=False) -> str:
+    """Regular expression of filter_keyword, a list of terms becomes an escaped alternation"""
+    if isinstance(target_word, str):
+        pattern = target_word
+    else:
+        pattern = "|".join(pl.escape_regex(term) for term in get_terms(target_word))
+    if whole_word:
+        pattern = rf"\b(?:{pattern})\b"
+    if ignore_case:
+        pattern = f"(?i){pattern}"
+    return pattern
+
+
+def keyword_expr(schema:pl.Schema, target_word, ignore_case:bool=False, whole_word:bool=False) -> pl.Expr:
+    """Predicate of filter_keyword, schema is the schema of the filtered frame"""
+
+    # list of literal terms, one aho-corasick pass per column
+    if not isinstance(target_word, str) and not whole_word:
+        terms = get_terms(target_word)
+        return pl.any_horizontal([
+            column.str.contains_any(terms, ascii_case_insensitive=ignore_case) for column in keyword_columns(schema)
+        ])
+
+    # regex, alternations of terms are compiled once and matched in one pass
+    pattern = keyword_pattern(target_word, ignore_case, whole_word)
+    return pl.any_horizontal([column.str.contains(pattern, literal=False) for column in keyword_columns(schema)])
+
+
+def matched_terms_expr(schema:pl.Schema, target_word, ignore_case:bool=False, whole_word:bool=False) -> pl.Expr:
+    """Distinct terms of target_word found in title, abstract or keywords, as a List[Utf8] expression
+    For a str target_word, the matched substrings are reported"""
+
+    columns = [column.fill_null("") for column in keyword_columns(schema)]
+    if not isinstance(target_word, str) and not whole_word:
+        terms = get_terms(target_word)
+        found = [column.str.extract_many(terms, ascii_case_insensitive=ignore_case, overlapping=True) for column in columns]
+    else:
+        pattern = keyword_pattern(target_word, ignore_case, whole_word)
+        found = [column.str.extract_all(pattern) for column in columns]
+    found = pl.concat_list(found)
+
+    # matches are the text of the article, map them back to the searched terms
+    if ignore_case and not isinstance(target_word, str):
+        lookup = {term.lower(): term for term in reversed(get_terms(target_word))}
+        found = found.list.eval(pl.element().str.to_lowercase().replace_strict(lookup, default=None, return_dtype=pl.Utf8))
+
+    return found.list.unique(maintain_order=True)
+
+
+def list_column_expr(schema:pl.Schema, column:str) -> pl.Expr:
+    """Return column as a List[Utf8] expression, splitting '; ' joined strings if needed
+
+    Args:
+        - schema (pl.Schema) : schema of the dataframe containing article
+        - column (str) : MeSHTerms, Keywords or Authors
+
+    Returns:
+        - (pl.Expr) : list expression
+    
+    """
+    if schema[column] == pl.Utf8:
+        return pl.col(column).str.split("; ")
+    return pl.col(column)
+
+
+def filter_list_column(df:pl.DataFrame, column:str, values:list, match_all:bool=False) -> pl.DataFrame:
+    """Keep articles whose list column contains any (or all) of the values, using exact matches
+
+    Args:
+        - df (pl.DataFrame) : polars dataframe containing article
+        - column (str) : MeSHTerms, Keywords or Authors
+        - values (list) : values to look for
+        - match_all (bool) : if set to True, all values must be present
+
+    Returns:
+        - (pl.DataFrame) : filtered dataframe
+    
+    """
+
+    return df.filter(list_match_expr(df.schema, column, values, match_all))
+
+
+def list_match_expr(schema:pl.Schema, column:str, values:list, match_all:bool=False) -> pl.Expr:
+    """Predicate of filter_list_column, schema is the schema of the filtered frame"""
+    values = list(set(values))
+    found = list_column_expr(schema, column).list.eval(pl.element().filter(pl.element().is_in(values)))
+    if match_all:
+        return found.list.n_unique() == len(values)
+    return found.list.len() > 0
+
+
+def filter_mesh(df:pl.DataFrame, mesh_terms:list, match_all:bool=False) -> pl.DataFrame:
+    """Filter article annotated with the given MeSH terms
+
+    Args:
+        - df (pl.DataFrame) : polars dataframe containing article
+        - mesh_terms (list) : MeSH descriptors, e.g ['Humans', 'Neoplasms']
+        - match_all (bool) : if set to True, keep article having all the terms instead of any of them
+
+    Returns:
+        - (pl.DataFrame) : filtered dataframe
+    
+    """
+    return filter_list_column(df, "MeSHTerms", mesh_terms, match_all)
+
+
+def filter_authors(df:pl.DataFrame, authors:list, match_all:bool=False) -> pl.DataFrame:
+    """Filter article written by any (or all) of the given authors
+
+    Args:
+        - df (pl.DataFrame) : polars dataframe containing article
+        - authors (list) : author names, formated as 'ForeName LastName'
+        - match_all (bool) : if set to True, keep article having all the authors instead of any of them
+
+    Returns:
+        - (pl.DataFrame) : filtered dataframe
+    
+    """
+    return filter_list_column(df, "Authors", authors, match_all)
+
+
+def get_corpus_files(folders:list) -> list:
+    """Sorted parquet files of the corpus folders"""
+    if isinstance(folders, str):
+        folders = [folders]
+    return sorted(pqf for folder in folders for pqf in glob.glob(f"{folder}/*.parquet"))
+
+
+def scan_corpus(folders:list, files:list=None) -> pl.LazyFrame:
+    """Lazily scan the parquet files of a local corpus
+
+    Args:
+        - folders (list) : folders containing parquet files, e.g baseline and updatefiles output folders
+        - files (list) : if set, only scan these source files (pubmed.xml.gz or .parquet names)
+
+    Returns:
+        - (pl.LazyFrame) : articles of the corpus
+    
+    """
+
+    parquet_files = get_corpus_files(folders)
+    if files is not None:
+        keep = {os.path.basename(f).replace('.xml.gz', '.parquet') for f in files}
+        parquet_files = [pqf for pqf in parquet_files if os.path.basename(pqf) in keep]
+
+    if not parquet_files:
+        return pl.LazyFrame()
+
+    return pl.scan_parquet(parquet_files)
+
+
+def query_corpus(folders:list, date_min:str=None, date_max:str=None, keywords:list=None, mesh_terms:list=None, journals:list=None, columns:list=None, map_file:str=None, match_all:bool=False, ignore_case:bool=False, whole_word:bool=False) -> pl.LazyFrame:
+    """Compose date, keyword, MeSH and journal predicates over a local corpus
+    Nothing is loaded, predicates are pushed into the parquet scan so row
+    groups whose statistics exclude the date window are skipped, and when a
+    map file is given files without any article in the window are not
+    scanned at all. Pruning never changes the result: every version of an
+    article is returned, e.g a baseline article revised in an updatefile
+    shows up twice with or without map file
+
+    Args:
+        - folders (list) : folders containing parquet files, e.g baseline and updatefiles output folders
+        - date_min (str) : min publication date, formated as d/m/Y
+        - date_max (str) : max publication date, formated as d/m/Y
+        - keywords (list) : terms to search in title, abstract or keywords, any of them
+        - mesh_terms (list) : MeSH descriptors to look for
+        - journals (list) : journal titles to keep
+        - columns (list) : columns to return, default to all columns
+        - map_file (str) : map file used to skip files outside the date window, files it does not index are always scanned
+        - match_all (bool) : if set to True, articles must have all the MeSH terms instead of any of them
+        - ignore_case (bool) : if set to True, case insensitive keyword search
+        - whole_word (bool) : if set to True, keywords only match whole words
+
+    Returns:
+        - (pl.LazyFrame) : filtered articles
+    
+    """
+
+    # preprocess dates
+    date_min = dt.datetime.strptime(date_min, "%d/%m/%Y").date() if date_min else None
+    date_max = dt.datetime.strptime(date_max, "%d/%m/%Y").date() if date_max else None
+
+    # file level pruning, any file holding an article of the window is kept (not only the
+    # latest version of each pmid) so that the result is the same as without map file
+    files = None
+    if map_file and (date_min or date_max):
+        mapped = get_files_between_date(
+            (date_min or dt.date.min).isoformat(), (date_max or dt.date.max).isoformat(), map_file, latest=False
+        )
+        indexed = set(get_indexed_files(map_file))
+        unindexed = [
+            source_file for source_file in (os.path.basename(pqf).replace('.parquet', '.xml.gz') for pqf in get_corpus_files(folders))
+            if source_file not in indexed
+        ]
+        files = mapped['baseline'] + mapped['updatefiles'] + unindexed
+
+    lf = scan_corpus(folders, files)
+    schema = lf.collect_schema()
+    if not schema:
+        return lf
+
+    # compose predicates
+    predicates = []
+    if date_min or date_max:
+        predicates.append(date_expr(date_min, date_max))
+    if journals:
+        predicates.append(pl.col("Journal").is_in(journals))
+    if mesh_terms:
+        predicates.append(list_match_expr(schema, "MeSHTerms", mesh_terms, match_all))
+    if keywords:
+        predicates.append(keyword_expr(schema, keywords, ignore_case, whole_word))
+
+    if predicates:
+        lf = lf.filter(pl.all_horizontal(predicates))
+    if columns:
+        lf = lf.select(columns)
+
+    return lf
+
+
+def sink_query(lf:pl.LazyFrame, output_file:str) -> None:
+    """Stream the result of a corpus query to a parquet or csv file
+
+    Args:
+        - lf (pl.LazyFrame) : query, see query_corpus
+        - output_file (str) : path to the result file (.parquet or .csv)
+    
+    """
+
+    if output_file.endswith(".csv"):
+        # csv has no list type, list columns are written '; ' joined
+        list_columns = [name for name, dtype in lf.collect_schema().items() if dtype == pl.List(pl.Utf8)]
+        lf.with_columns(pl.col(list_columns).list.join("; ")).sink_csv(output_file)
+    elif output_file.endswith(".parquet"):
+        lf.sink_parquet(output_file)
+    else:
+        raise ValueError(f"Unsupported output format for {output_file}, expected .parquet or .csv")
+
+
 if __name__ == "__main__":
 
     df = pl.read_parquet("/tmp/test.parquet")
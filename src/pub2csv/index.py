@@ -0,0 +1,273 @@
+import glob
+import os
+import polars as pl
+
+from .filter import list_column_expr
+
+
+# words are lowercased \w+ runs, phrases are indexed as bigrams of consecutive words
+TOKEN_PATTERN = r"\w+"
+
+# terms per row group of the postings files, lookups only read the row groups holding the terms
+POSTINGS_ROW_GROUP_SIZE = 10000
+
+# indexed source files, inactive segments are dropped at the next compaction
+SEGMENTS_SCHEMA = {'SegmentId': pl.UInt32, 'SourceFile': pl.Utf8, 'Active': pl.Boolean}
+
+
+def get_segments_file(index_folder:str) -> str:
+    """Table listing the segments of the index"""
+    return f"{index_folder}/segments.parquet"
+
+
+def load_segments(index_folder:str) -> pl.DataFrame:
+    """Load the segments of the index, empty table for a new index"""
+    segments_file = get_segments_file(index_folder)
+    if os.path.isfile(segments_file):
+        return pl.read_parquet(segments_file)
+    return pl.DataFrame(schema=SEGMENTS_SCHEMA)
+
+
+def save_segments(segments:pl.DataFrame, index_folder:str) -> None:
+    """Save the segments of the index"""
+    segments_file = get_segments_file(index_folder)
+    segments.sort('SegmentId').write_parquet(f"{segments_file}.tmp")
+    os.replace(f"{segments_file}.tmp", segments_file)
+
+
+def tokenize_expr(column:pl.Expr) -> pl.Expr:
+    """Lowercased words of a text column, as a List[Utf8] expression"""
+    return column.str.to_lowercase().str.extract_all(TOKEN_PATTERN)
+
+
+def tokenize(text:str) -> list:
+    """Words of a query, tokenized as the indexed text"""
+    return pl.Series([text]).str.to_lowercase().str.extract_all(TOKEN_PATTERN)[0].to_list()
+
+
+def get_index_terms(item:str) -> list:
+    """Index terms an article must hold to match a query item
+    A word is looked up as is, a phrase as the bigrams of its consecutive words"""
+    words = tokenize(item)
+    if len(words) < 2:
+        return words
+    return [f"{a} {b}" for a, b in zip(words[:-1], words[1:])]
+
+
+def build_postings(parquet_file:str, segment_id:int) -> tuple:
+    """Build the posting lists of a parquet file produced by xml_to_parquet
+    Title, Abstract and Keywords are tokenized, words and bigrams are mapped
+    to the sorted PMID of the articles holding them
+
+    Args:
+        - parquet_file (str) : path to the parquet file
+        - segment_id (int) : id of the segment
+
+    Returns:
+        - (tuple) : postings (Term, SegmentId, Postings) and docs (PMID, SegmentId) tables
+
+    """
+
+    df = pl.scan_parquet(parquet_file)
+    pmid = pl.col('PMID').cast(pl.UInt32)
+
+    # words and bigrams of each field, bigrams do not cross fields and each keyword is its own field
+    keywords = df.select(pmid, list_column_expr(df.collect_schema(), 'Keywords').alias('Keyword')).explode('Keyword')
+    fields = pl.concat([
+        df.select(pmid, tokenize_expr(pl.col('Title')).alias('Words')),
+        df.select(pmid, tokenize_expr(pl.col('Abstract')).alias('Words')),
+        keywords.select('PMID', tokenize_expr(pl.col('Keyword')).alias('Words')),
+    ])
+    bigrams = pl.concat_str([pl.element(), pl.element().shift(-1)], separator=' ')
+    fields = fields.with_columns(pl.col('Words').list.eval(bigrams.drop_nulls()).alias('Bigrams'))
+
+    # posting lists
+    postings = (
+        pl.concat([
+            fields.select('PMID', pl.col('Words').alias('Term')),
+            fields.select('PMID', pl.col('Bigrams').alias('Term')),
+        ])
+        .explode('Term')
+        .drop_nulls('Term')
+        .group_by('Term')
+        .agg(pl.col('PMID').unique().sort().alias('Postings'))
+        .with_columns(pl.lit(segment_id, dtype=pl.UInt32).alias('SegmentId'))
+        .select('Term', 'SegmentId', 'Postings')
+        .sort('Term')
+        .collect()
+    )
+    docs = (
+        df.select(pl.col('PMID').cast(pl.UInt32).unique().sort())
+        .with_columns(pl.lit(segment_id, dtype=pl.UInt32).alias('SegmentId'))
+        .collect()
+    )
+
+    return postings, docs
+
+
+def write_table(table, output_file:str) -> None:
+    """Write a postings or docs table (DataFrame or LazyFrame) with row group statistics"""
+    tmp_file = f"{output_file}.tmp"
+    if isinstance(table, pl.LazyFrame):
+        table.sink_parquet(tmp_file, statistics=True, row_group_size=POSTINGS_ROW_GROUP_SIZE)
+    else:
+        table.write_parquet(tmp_file, statistics=True, row_group_size=POSTINGS_ROW_GROUP_SIZE)
+    os.replace(tmp_file, output_file)
+
+
+def compact_index(index_folder:str) -> None:
+    """Merge the segments of the index in a single postings and docs file,
+    entries of inactive segments are dropped
+
+    Args:
+        - index_folder (str) : path to the index folder
+
+    """
+
+    segments = load_segments(index_folder)
+    active = segments.filter('Active')['SegmentId'].implode()
+    for table, sort in [('postings', ['Term', 'SegmentId']), ('docs', ['PMID', 'SegmentId'])]:
+        parts = sorted(glob.glob(f"{index_folder}/{table}/*.parquet"))
+        if not parts:
+            continue
+        main_file = f"{index_folder}/{table}/main.parquet"
+        merged = pl.scan_parquet(parts).filter(pl.col('SegmentId').is_in(active)).sort(sort)
+
+        # swap the merged file in before dropping the segments, a crash never loses entries
+        write_table(merged, f"{main_file}.merged")
+        os.replace(f"{main_file}.merged", main_file)
+        for part in parts:
+            if part != main_file:
+                os.remove(part)
+
+    save_segments(segments.filter('Active'), index_folder)
+
+
+def update_index(folders:list, index_folder:str, reprocessed:list=None, max_segments:int=32) -> dict:
+    """Index the parquet files not indexed yet, e.g the latest updatefiles
+    Each new file goes to its own segment so the cost is proportional to the
+    new data, segments are merged once there are more than max_segments of them
+
+    Args:
+        - folders (list) : folders containing parquet files, e.g baseline and updatefiles output folders
+        - index_folder (str) : path to the index folder
+        - reprocessed (list) : source files (pubmed.xml.gz) to index again
+        - max_segments (int) : number of segments triggering a compaction
+
+    Returns:
+        - (dict) : added source files and compacted flag
+
+    """
+
+    if isinstance(folders, str):
+        folders = [folders]
+
+    # init index folder
+    os.makedirs(f"{index_folder}/postings", exist_ok=True)
+    os.makedirs(f"{index_folder}/docs", exist_ok=True)
+
+    # re-processed files are indexed again, their old segment is deactivated
+    segments = load_segments(index_folder)
+    reprocessed = reprocessed or []
+    segments = segments.with_columns(pl.col('Active') & ~pl.col('SourceFile').is_in(reprocessed))
+    indexed = set(segments.filter('Active')['SourceFile'])
+
+    # spot files not indexed yet
+    new_files = []
+    for folder in folders:
+        for pqf in sorted(glob.glob(f"{folder}/*.parquet")):
+            source_file = os.path.basename(pqf).replace('.parquet', '.xml.gz')
+            if source_file not in indexed:
+                new_files.append((pqf, source_file))
+
+    # one segment per file
+    next_id = segments['SegmentId'].max() + 1 if segments.height else 0
+    added = []
+    for segment_id, (pqf, source_file) in enumerate(new_files, start=next_id):
+        postings, docs = build_postings(pqf, segment_id)
+        write_table(postings, f"{index_folder}/postings/{segment_id:06d}.parquet")
+        write_table(docs, f"{index_folder}/docs/{segment_id:06d}.parquet")
+        added.append({'SegmentId': segment_id, 'SourceFile': source_file, 'Active': True})
+    segments = pl.concat([segments, pl.DataFrame(added, schema=SEGMENTS_SCHEMA)])
+    save_segments(segments, index_folder)
+
+    # merge segments from time to time
+    compacted = len(glob.glob(f"{index_folder}/postings/*.parquet")) > max_segments
+    if compacted:
+        compact_index(index_folder)
+
+    return {'added': [row['SourceFile'] for row in added], 'compacted': compacted}
+
+
+def search_index(index_folder:str, query:list, mode:str="and") -> pl.Series:
+    """Search the index for articles holding all (and) or any (or) of the query items
+    An item is a word or a phrase, phrases match articles holding all their
+    consecutive word pairs. When an article is indexed in several files, only
+    its latest version (updatefiles over baseline) is searched
+
+    Args:
+        - index_folder (str) : path to the index folder
+        - query (list) : words or phrases, e.g ['cancer', 'gene expression']
+        - mode (str) : and or or
+
+    Returns:
+        - (pl.Series) : sorted PMID (UInt32) of the matching articles
+
+    """
+
+    if mode not in ("and", "or"):
+        raise ValueError(f"Unknown search mode {mode}, expected 'and' or 'or'")
+
+    # index terms of each query item
+    if isinstance(query, str):
+        query = [query]
+    items = pl.DataFrame(
+        [(i, term) for i, item in enumerate(query) for term in get_index_terms(item)],
+        schema={'Item': pl.UInt32, 'Term': pl.Utf8},
+        orient='row',
+    ).unique()
+    n_terms = items.group_by('Item').agg(pl.len().alias('NTerms'))
+    empty = pl.Series('PMID', [], dtype=pl.UInt32)
+    if items.is_empty() or (mode == "and" and n_terms.height < len(query)):
+        return empty
+
+    segments = load_segments(index_folder).filter('Active')
+    postings_files = sorted(glob.glob(f"{index_folder}/postings/*.parquet"))
+    if segments.is_empty() or not postings_files:
+        return empty
+
+    # postings of the query terms, only row groups holding them are read
+    # plain lists keep the predicates prunable with row group statistics
+    active = segments['SegmentId'].to_list()
+    hits = (
+        pl.scan_parquet(postings_files)
+        .filter(pl.col('Term').is_in(items['Term'].to_list()) & pl.col('SegmentId').is_in(active))
+        .explode('Postings')
+        .rename({'Postings': 'PMID'})
+        .collect()
+    )
+
+    # keep hits from the latest segment of each article
+    latest = (
+        pl.scan_parquet(sorted(glob.glob(f"{index_folder}/docs/*.parquet")))
+        .filter(pl.col('PMID').is_in(hits['PMID'].unique().implode()))
+        .join(segments.lazy().select('SegmentId', 'SourceFile'), on='SegmentId')
+        .sort('SourceFile')
+        .group_by('PMID')
+        .agg(pl.col('SegmentId').last())
+        .collect()
+    )
+    hits = hits.join(latest, on=['PMID', 'SegmentId'], how='semi')
+
+    # item matches, then combine items
+    matches = (
+        hits.join(items, on='Term')
+        .group_by('Item', 'PMID')
+        .agg(pl.col('Term').n_unique().alias('NFound'))
+        .join(n_terms, on='Item')
+        .filter(pl.col('NFound') == pl.col('NTerms'))
+    )
+    if mode == "and":
+        matches = matches.group_by('PMID').agg(pl.col('Item').n_unique()).filter(pl.col('Item') == len(query))
+
+    return matches['PMID'].unique().sort()
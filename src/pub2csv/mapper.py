@@ -1,9 +1,147 @@
 import glob
+import json
+import os
+import threading
 import polars as pl
-from tqdm import tqdm
+from functools import lru_cache
+
+# columns of the map file
+MAP_SCHEMA = {'PMID': pl.Utf8, 'PublicationDate': pl.Date, 'Source': pl.Utf8, 'SourceFile': pl.Utf8}
+
+# rows per row group of the map file, each one holds a narrow date range
+MAP_ROW_GROUP_SIZE = 100000
+
+# indexed source files and the map segment holding their entries ('' for the main map file)
+SOURCES_SCHEMA = {'SourceFile': pl.Utf8, 'Source': pl.Utf8, 'Segment': pl.Utf8}
+
+# compact map, sorted by PMID and stored as uncompressed arrow ipc so it can be memory mapped
+COMPACT_EXTENSION = '.arrow'
+COMPACT_SCHEMA = {'PMID': pl.UInt32, 'PublicationDate': pl.Date, 'FileId': pl.UInt16, 'Update': pl.Boolean}
+
+
+def get_segment_folder(map_file:str) -> str:
+    """Folder holding the segments appended to map_file by update_map"""
+    return map_file.replace('.parquet', '_segments')
+
+
+def get_sources_file(map_file:str) -> str:
+    """Side table listing the source files indexed in map_file"""
+    return map_file.replace('.parquet', '_sources.parquet')
+
+
+def get_map_files(map_file:str) -> list:
+    """Main map file followed by its appended segments"""
+    return [map_file] + sorted(glob.glob(f"{get_segment_folder(map_file)}/*.parquet"))
+
+
+def get_map_stamp(map_file:str) -> list:
+    """Path, size and mtime of the map file, its segments and its sources table
+    Any update_map, remove_from_map or compact_map call changes it"""
+    return [
+        [f, os.path.getsize(f), os.stat(f).st_mtime_ns]
+        for f in get_map_files(map_file) + [get_sources_file(map_file)] if os.path.isfile(f)
+    ]
+
+
+def scan_map(map_file:str) -> pl.LazyFrame:
+    """Lazily scan the map file and its segments
+
+    Args:
+        - map_file (str) : path to the map file (should be a .parquet)
+
+    Returns:
+        - (pl.LazyFrame) : map entries (PMID, PublicationDate, Source, SourceFile)
+    
+    """
+    return pl.scan_parquet(get_map_files(map_file))
+
+
+def scan_file(parquet_file:str, source:str) -> pl.LazyFrame:
+    """Lazily scan the PMID and PublicationDate of a parquet file as map entries"""
+    return pl.scan_parquet(parquet_file).select(
+        'PMID',
+        'PublicationDate',
+        pl.lit(source).alias('Source'),
+        pl.lit(os.path.basename(parquet_file).replace('.parquet', '.xml.gz')).alias('SourceFile'),
+    )
+
+
+def scan_source(folder:str, source:str) -> list:
+    """Lazily scan the PMID and PublicationDate of each parquet file in folder
+
+    Args:
+        - folder (str) : path to the folder containing the parquet files
+        - source (str) : pubmed source of the files (baseline or updatefiles)
+
+    Returns:
+        - (list) : one pl.LazyFrame per parquet file
+    
+    """
+    return [scan_file(pf, source) for pf in sorted(glob.glob(f"{folder}/*.parquet"))]
+
+
+def write_entries(entries:list, output_file:str) -> None:
+    """Sort map entries by PublicationDate and stream them to a parquet file
+    Row groups keep their statistics so date queries can skip them
+
+    Args:
+        - entries (list) : list of pl.LazyFrame map entries
+        - output_file (str) : parquet file to write
+    
+    """
+
+    tmp_file = f"{output_file}.tmp"
+    if entries:
+        (
+            pl.concat(entries, how='vertical_relaxed')
+            .sort('PublicationDate', nulls_last=True)
+            .sink_parquet(tmp_file, statistics=True, row_group_size=MAP_ROW_GROUP_SIZE)
+        )
+    else:
+        pl.DataFrame(schema=MAP_SCHEMA).write_parquet(tmp_file)
+    os.replace(tmp_file, output_file)
+
+
+def load_sources(map_file:str) -> pl.DataFrame:
+    """Load the indexed source files of map_file
+    Maps built before the side table existed are indexed from their content
+
+    Args:
+        - map_file (str) : path to the map file (should be a .parquet)
+
+    Returns:
+        - (pl.DataFrame) : SourceFile, Source, Segment
+    
+    """
+
+    sources_file = get_sources_file(map_file)
+    if os.path.isfile(sources_file):
+        return pl.read_parquet(sources_file)
+    if not os.path.isfile(map_file):
+        return pl.DataFrame(schema=SOURCES_SCHEMA)
+
+    return (
+        pl.scan_parquet(map_file)
+        .select('SourceFile', 'Source')
+        .unique()
+        .with_columns(pl.lit('').alias('Segment'))
+        .sort('SourceFile')
+        .collect()
+    )
+
+
+def save_sources(sources:pl.DataFrame, map_file:str) -> None:
+    """Save the indexed source files of map_file"""
+    sources_file = get_sources_file(map_file)
+    sources.sort('SourceFile').write_parquet(f"{sources_file}.tmp")
+    os.replace(f"{sources_file}.tmp", sources_file)
+
 
 def extract_map(baseline_folder:str, updatefiles_folder:str, map_file:str) -> None:
     """Exctract data from parquet file to build a map file
+    Files are scanned lazily and the map is streamed to disk sorted by
+    PublicationDate, with row group statistics so date queries can skip
+    row groups
     
     Args:
         - baseline_folder (str) : path to the folder containing baseline pubmed.xml.gz
@@ -12,130 +150,535 @@ def extract_map(baseline_folder:str, updatefiles_folder:str, map_file:str) -> No
     
     """
 
-    # init data
-    data = []
-
-    # load baseline
-    for pf in glob.glob(f"{baseline_folder}/*.parquet"):
-        df = pl.read_parquet(pf)['PMID', 'PublicationDate']
-        for row in df.iter_rows():
-            vector = {
-                'PMID':row[0],
-                'PublicationDate':row[1],
-                'Source':'baseline',
-                'SourceFile':pf.replace('.parquet', '.xml.gz').split('/')[-1]
-            }
-            data.append(vector)
-
-    # load updatefiles
-    for pf in glob.glob(f"{updatefiles_folder}/*.parquet"):
-        df = pl.read_parquet(pf)['PMID', 'PublicationDate']
-        for row in df.iter_rows():
-            vector = {
-                'PMID':row[0],
-                'PublicationDate':row[1],
-                'Source':'updatefiles',
-                'SourceFile':pf.replace('.parquet', '.xml.gz').split('/')[-1]
-            }
-            data.append(vector)
-
-    # assemble and save
-    df = pl.DataFrame(data)
-    df.write_parquet(map_file)
-
-
-def get_files_for_pmid(pmid_list:list, map_file:str) -> dict:
+    # one lazy frame per source file
+    sources = {
+        'baseline': sorted(glob.glob(f"{baseline_folder}/*.parquet")),
+        'updatefiles': sorted(glob.glob(f"{updatefiles_folder}/*.parquet")),
+    }
+    frames = [scan_file(pf, source) for source, files in sources.items() for pf in files]
+
+    # assemble and save, a full rebuild replaces any appended segment
+    write_entries(frames, map_file)
+    for segment in get_map_files(map_file)[1:]:
+        os.remove(segment)
+
+    # index source files
+    save_sources(pl.DataFrame({
+        'SourceFile': [os.path.basename(pf).replace('.parquet', '.xml.gz') for files in sources.values() for pf in files],
+        'Source': [source for source, files in sources.items() for _ in files],
+        'Segment': '',
+    }, schema=SOURCES_SCHEMA), map_file)
+
+
+def remove_from_map(map_file:str, source_files:list) -> list:
+    """Remove the entries of source files from the map, e.g before indexing a re-processed file
+    Only the segments holding these files are rewritten
+
+    Args:
+        - map_file (str) : path to the map file (should be a .parquet)
+        - source_files (list) : name of the source files to remove (pubmed.xml.gz)
+
+    Returns:
+        - (list) : source files actually removed
+    
+    """
+
+    sources = load_sources(map_file)
+    removed = sources.filter(pl.col('SourceFile').is_in(source_files))
+    if removed.is_empty():
+        return []
+
+    # rewrite affected segments without the removed files
+    segment_folder = get_segment_folder(map_file)
+    for segment in removed['Segment'].unique().to_list():
+        segment_file = os.path.join(segment_folder, segment) if segment else map_file
+        remaining = sources.filter((pl.col('Segment') == segment) & ~pl.col('SourceFile').is_in(source_files))
+        if segment and remaining.is_empty():
+            os.remove(segment_file)
+        else:
+            entries = pl.scan_parquet(segment_file).filter(~pl.col('SourceFile').is_in(source_files))
+            write_entries([entries], segment_file)
+
+    save_sources(sources.filter(~pl.col('SourceFile').is_in(source_files)), map_file)
+
+    return removed['SourceFile'].to_list()
+
+
+def compact_map(map_file:str) -> None:
+    """Merge the appended segments into the main map file
+
+    Args:
+        - map_file (str) : path to the map file (should be a .parquet)
+    
+    """
+
+    map_files = get_map_files(map_file)
+    if len(map_files) == 1:
+        return
+
+    write_entries([pl.scan_parquet(map_files)], map_file)
+    for segment in map_files[1:]:
+        os.remove(segment)
+
+    save_sources(load_sources(map_file).with_columns(pl.lit('').alias('Segment')), map_file)
+
+
+def update_map(baseline_folder:str, updatefiles_folder:str, map_file:str, reprocessed:list=None, max_segments:int=32) -> dict:
+    """Index the parquet files not yet in the map, e.g the latest updatefiles
+    New entries go to a new segment next to the map file so the cost is
+    proportional to the new data, segments are merged once there are more
+    than max_segments of them
+
+    Args:
+        - baseline_folder (str) : path to the folder containing baseline pubmed.xml.gz
+        - updatefiles_folder (str) : path to the folder containing updatefiles pubmed.xml.gz
+        - map_file (str) : path to the map file (should be a .parquet)
+        - reprocessed (list) : source files (pubmed.xml.gz) to index again
+        - max_segments (int) : number of segments triggering a compaction
+
+    Returns:
+        - (dict) : added, removed source files and compacted flag
+    
+    """
+
+    # first run
+    if not os.path.isfile(map_file):
+        extract_map(baseline_folder, updatefiles_folder, map_file)
+        return {'added': load_sources(map_file)['SourceFile'].to_list(), 'removed': [], 'compacted': False}
+
+    # drop outdated entries
+    removed = remove_from_map(map_file, reprocessed or [])
+
+    # spot files not indexed yet
+    indexed = set(load_sources(map_file)['SourceFile'])
+    new_files = []
+    for source, folder in [('baseline', baseline_folder), ('updatefiles', updatefiles_folder)]:
+        for pf in sorted(glob.glob(f"{folder}/*.parquet")):
+            source_file = os.path.basename(pf).replace('.parquet', '.xml.gz')
+            if source_file not in indexed:
+                new_files.append((pf, source, source_file))
+
+    if not new_files:
+        return {'added': [], 'removed': removed, 'compacted': False}
+
+    # append a new segment
+    segment_folder = get_segment_folder(map_file)
+    os.makedirs(segment_folder, exist_ok=True)
+    segments = get_map_files(map_file)[1:]
+    last = int(os.path.basename(segments[-1]).split('.')[0]) if segments else 0
+    segment = f"{last + 1:06d}.parquet"
+    write_entries([scan_file(pf, source) for pf, source, _ in new_files], os.path.join(segment_folder, segment))
+
+    # index new files
+    save_sources(pl.concat([
+        load_sources(map_file),
+        pl.DataFrame({
+            'SourceFile': [source_file for _, _, source_file in new_files],
+            'Source': [source for _, source, _ in new_files],
+            'Segment': segment,
+        }, schema=SOURCES_SCHEMA),
+    ]), map_file)
+
+    # merge segments from time to time
+    compacted = len(segments) + 1 > max_segments
+    if compacted:
+        compact_map(map_file)
+
+    return {'added': [source_file for _, _, source_file in new_files], 'removed': removed, 'compacted': compacted}
+
+
+def to_pmid_series(pmids, dtype:pl.DataType=pl.Utf8) -> pl.Series:
+    """Convert a batch of pmid to a polars Series of the map PMID type
+
+    Args:
+        - pmids (list | pl.Series | pyarrow.Array) : batch of pmid
+        - dtype (pl.DataType) : type of the PMID column in the map file
+
+    Returns:
+        - (pl.Series) : PMID Series
+    
+    """
+    if isinstance(pmids, pl.Series):
+        pmids = pmids.alias('PMID')
+    else:
+        pmids = pl.Series('PMID', pmids)
+    return pmids.cast(dtype, strict=False)
+
+
+def select_files(entries:pl.LazyFrame) -> dict:
+    """Pick the files to load for a set of map entries
+    For each pmid keep its updatefiles entries if any, otherwise its baseline ones
+
+    Args:
+        - entries (pl.LazyFrame) : map entries (PMID, Source, SourceFile)
+
+    Returns:
+        - (dict) : sorted distinct baseline and updatefiles files
+    
+    """
+
+    is_update = pl.col('Source') == 'updatefiles'
+    return group_files(entries.filter(is_update | ~is_update.any().over('PMID')))
+
+
+def group_files(entries:pl.LazyFrame) -> dict:
+    """Sorted distinct baseline and updatefiles files of map entries"""
+    files = (
+        entries
+        .group_by('Source')
+        .agg(pl.col('SourceFile').unique().sort())
+        .collect()
+    )
+    files = dict(zip(files['Source'], files['SourceFile'].to_list()))
+
+    return {'baseline':files.get('baseline', []), 'updatefiles':files.get('updatefiles', [])}
+
+
+def get_files_table(compact_file:str) -> str:
+    """Side table of the compact map, FileId to SourceFile and Source"""
+    return compact_file.replace(COMPACT_EXTENSION, '_files.parquet')
+
+
+def encode_map(map_file:str) -> tuple:
+    """Compact typed encoding of the map, see write_compact_map
+
+    Args:
+        - map_file (str) : path to the map file (should be a .parquet)
+
+    Returns:
+        - (tuple) : entries (pl.LazyFrame sorted by PMID) and files (pl.DataFrame) tables
+    
+    """
+
+    # source file ids
+    files = (
+        load_sources(map_file)
+        .select('SourceFile', 'Source')
+        .sort('SourceFile')
+        .with_row_index('FileId')
+        .with_columns(pl.col('FileId').cast(pl.UInt16))
+    )
+
+    # encode and sort
+    entries = (
+        scan_map(map_file)
+        .join(files.lazy().select('SourceFile', 'FileId'), on='SourceFile')
+        .select(
+            pl.col('PMID').cast(pl.UInt32),
+            'PublicationDate',
+            'FileId',
+            (pl.col('Source') == 'updatefiles').alias('Update'),
+        )
+        .sort('PMID', 'FileId')
+    )
+
+    return entries, files
+
+
+def write_compact_map(map_file:str, compact_file:str) -> None:
+    """Encode the map in a compact typed form for PMID lookups
+    PMID is stored as UInt32, source files as UInt16 ids resolved through a
+    side table and Source as an Update flag, rows are sorted by PMID.
+    The side table records the path and stamp of map_file so that the
+    compact map is rebuilt once map_file changes, see refresh_compact_map
+
+    Args:
+        - map_file (str) : path to the map file (should be a .parquet)
+        - compact_file (str) : path to the compact map (should be a .arrow)
+    
+    """
+
+    # stamp taken first, a change during the encoding triggers a rebuild
+    stamp = get_map_stamp(map_file)
+    entries, files = encode_map(map_file)
+    entries.sink_ipc(f"{compact_file}.tmp", compression='uncompressed')
+    os.replace(f"{compact_file}.tmp", compact_file)
+
+    # side table last, an interrupted write leaves a stale stamp behind
+    files_table = get_files_table(compact_file)
+    files.write_parquet(f"{files_table}.tmp", metadata={'map_file': os.path.abspath(map_file), 'map_stamp': json.dumps(stamp)})
+    os.replace(f"{files_table}.tmp", files_table)
+
+
+def get_compact_source(compact_file:str) -> tuple:
+    """Map file a compact map was built from and its stamp at that time
+
+    Args:
+        - compact_file (str) : path to the compact map (should be a .arrow)
+
+    Returns:
+        - (tuple) : (map file, stamp), None if unknown or if the map file is gone
+    
+    """
+    metadata = pl.read_parquet_metadata(get_files_table(compact_file))
+    if 'map_file' not in metadata or not os.path.isfile(metadata['map_file']):
+        return None
+    return metadata['map_file'], json.loads(metadata['map_stamp'])
+
+
+def refresh_compact_map(compact_file:str) -> bool:
+    """Rebuild the compact map if its map file changed since it was written, e.g by update_map
+    A compact map whose map file is not available is used as is
+
+    Args:
+        - compact_file (str) : path to the compact map (should be a .arrow)
+
+    Returns:
+        - (bool) : True if the compact map was rebuilt
+    
+    """
+    source = get_compact_source(compact_file)
+    if source is None or get_map_stamp(source[0]) == source[1]:
+        return False
+    write_compact_map(source[0], compact_file)
+    return True
+
+
+def load_compact_map(compact_file:str) -> tuple:
+    """Memory map the compact map and load its side table, rebuilding it first if outdated
+
+    Args:
+        - compact_file (str) : path to the compact map (should be a .arrow)
+
+    Returns:
+        - (tuple) : entries (pl.DataFrame sorted by PMID) and files (pl.DataFrame) tables
+    
+    """
+    refresh_compact_map(compact_file)
+
+    # uncompressed ipc is memory mapped by polars, nothing is copied until rows are gathered
+    entries = pl.read_ipc(compact_file)
+    files = pl.read_parquet(get_files_table(compact_file))
+    return entries, files
+
+
+def lookup_compact_map(pmid_list, entries:pl.DataFrame, files:pl.DataFrame) -> dict:
+    """Resolve pmid with a binary search in the PMID sorted compact map
+
+    Args:
+        - pmid_list (list | pl.Series | pyarrow.Array) : batch of pmid
+        - entries (pl.DataFrame) : compact map entries, see load_compact_map
+        - files (pl.DataFrame) : compact map side table, see load_compact_map
+
+    Returns:
+        - (dict) : baseline and updatefiles containing infos for given pmid
+    
+    """
+
+    # rows of each pmid, [start, end[ in the sorted map
+    pmids = to_pmid_series(pmid_list, pl.UInt32).drop_nulls().unique().sort()
+    bounds = pl.DataFrame({
+        'start': entries['PMID'].search_sorted(pmids, side='left'),
+        'end': entries['PMID'].search_sorted(pmids, side='right'),
+    })
+    rows = bounds.select(pl.int_ranges('start', 'end', dtype=pl.UInt32).explode().drop_nulls())
+
+    return select_file_ids(entries[rows.to_series()], files)
+
+
+def lookup_compact_dates(min_date:str, max_date:str, entries:pl.DataFrame, files:pl.DataFrame, latest:bool=True) -> dict:
+    """Resolve the files of articles published between min and max date in the compact map
+
+    Args:
+        - min_date (str) : min publication date
+        - max_date (str) : max publication date
+        - entries (pl.DataFrame) : compact map entries, see load_compact_map
+        - files (pl.DataFrame) : compact map side table, see load_compact_map
+        - latest (bool) : if set to False, keep the baseline files of pmid also found in updatefiles
+
+    Returns:
+        - (dict) : baseline and updatefiles containing infos for given dates
+    
+    """
+    min_date = pl.Series([min_date]).str.to_date("%Y-%m-%d")[0]
+    max_date = pl.Series([max_date]).str.to_date("%Y-%m-%d")[0]
+    return select_file_ids(entries.filter(pl.col('PublicationDate').is_between(min_date, max_date)), files, latest)
+
+
+def select_file_ids(matches:pl.DataFrame, files:pl.DataFrame, latest:bool=True) -> dict:
+    """select_files for compact map entries, prefer updatefiles then decode file ids"""
+    if latest:
+        matches = matches.filter(pl.col('Update') | ~pl.col('Update').any().over('PMID'))
+    file_ids = matches['FileId'].unique()
+    return group_files(files.lazy().filter(pl.col('FileId').is_in(file_ids.implode())))
+
+
+def get_files_for_pmid(pmid_list, map_file:str) -> dict:
     """Get files containing infos for pmid in pmid list
     If information is available both in baseline and updatefiles for a given
     pmid, keep only the updatefiles
 
     Args:
-        - pmid_list (list) : list of pmid (str)
-        - map_file (str) : path to the map file (should be a .parquet)
+        - pmid_list (list | pl.Series | pyarrow.Array) : batch of pmid
+        - map_file (str) : path to the map file (.parquet, or .arrow for the compact map)
 
     Returns:
         - (dict) : baseline and updatefiles containing infos for given pmid
     
     """
 
-    # init file list
-    baseline_file = []
-    updatefiles_file = []
-
-    # load data
-    df = pl.read_parquet(map_file).filter(pl.col('PMID').is_in(pmid_list))
+    # compact map, binary search
+    if map_file.endswith(COMPACT_EXTENSION):
+        return lookup_compact_map(pmid_list, *load_compact_map(map_file))
 
-    # check for associated file
-    for pmid in pmid_list:
-        
-        # filter dataframe
-        dfpmid = df.filter(pl.col('PMID') == pmid)
-        dfup = dfpmid.filter(pl.col('Source') == 'updatefiles')
-        dfba = dfpmid.filter(pl.col('Source') == 'baseline')
-
-        # Check update files
-        if dfup.shape[0] > 0:
-            for x in list(dfup['SourceFile']):
-                if x not in updatefiles_file:
-                    updatefiles_file.append(x)
-
-        # if no updatefile, go for baseline file
-        else:
-            for x in list(dfba['SourceFile']):
-                if x not in baseline_file:
-                    baseline_file.append(x)
+    # resolve requested pmid against the map
+    entries = scan_map(map_file)
+    pmids = to_pmid_series(pmid_list, entries.collect_schema()['PMID']).unique()
+    entries = entries.join(pl.LazyFrame([pmids]), on='PMID', how='semi')
 
-    return {'baseline':baseline_file, 'updatefiles':updatefiles_file}
+    return select_files(entries)
 
 
 
-def get_files_between_date(min_date:str, max_date:str, map_file:str) -> dict:
+def get_files_between_date(min_date:str, max_date:str, map_file:str, latest:bool=True) -> dict:
     """Get files containing infos for article published between min and max date
     If information is available both in baseline and updatefiles for a given
-    pmid, keep only the updatefiles
+    pmid, keep only the updatefiles unless latest is set to False
 
     Args:
         - min_date (str) : min publication date
         - max_date (str) : max publication date
-        - map_file (str) : path to the map file (should be a .parquet)
+        - map_file (str) : path to the map file (.parquet, or .arrow for the compact map)
+        - latest (bool) : if set to False, return every file holding an article of the window
 
     Returns:
         - (dict) : baseline and updatefiles containing infos for given pmid
     
     """
 
-    # init file list
-    baseline_file = []
-    updatefiles_file = []
+    # compact map
+    if map_file.endswith(COMPACT_EXTENSION):
+        return lookup_compact_dates(min_date, max_date, *load_compact_map(map_file), latest)
 
     # process date
     min_date = pl.Series([min_date]).str.to_date("%Y-%m-%d")[0]
     max_date = pl.Series([max_date]).str.to_date("%Y-%m-%d")[0]
     
-    # load data
-    df = pl.read_parquet(map_file).filter((pl.col('PublicationDate') >= min_date) & (pl.col('PublicationDate') <= max_date))
+    # load data, the map is sorted by date so only overlapping row groups are read
+    entries = scan_map(map_file).filter(pl.col('PublicationDate').is_between(min_date, max_date))
+
+    return select_files(entries) if latest else group_files(entries)
+
+
+def get_indexed_files(map_file:str) -> list:
+    """Source files (pubmed.xml.gz) indexed in the map
 
-    # check for associated file
-    for pmid in tqdm(set(df['PMID']), desc="Screening map file ..."):
+    Args:
+        - map_file (str) : path to the map file (.parquet, or .arrow for the compact map)
+
+    Returns:
+        - (list) : sorted source file names
+    
+    """
+    if map_file.endswith(COMPACT_EXTENSION):
+        return sorted(pl.read_parquet(get_files_table(map_file), columns=['SourceFile'])['SourceFile'])
+    return sorted(load_sources(map_file)['SourceFile'])
+
+
+class PubmedIndex:
+    """Long lived view of the map answering batched PMID and date range queries
+    The map is loaded once in its compact form (memory mapped for a .arrow
+    map), recent results are kept in a LRU cache and everything is reloaded
+    when the map files change on disk. A .arrow map also watches the map
+    file it was built from and is rebuilt when that one changes
+
+    Args:
+        - map_file (str) : path to the map file (.parquet, or .arrow for the compact map)
+        - cache_size (int) : number of query results kept in cache
+    
+    """
+
+    def __init__(self, map_file:str, cache_size:int=1024):
+        self.map_file = map_file
+        self.cache_size = cache_size
+        self.source_map = None
+        if map_file.endswith(COMPACT_EXTENSION):
+            source = get_compact_source(map_file)
+            self.source_map = source[0] if source else None
+        self.lock = threading.Lock()
+        self.stamp = None
+        self.entries = None
+        self.files = None
+        self.reload_if_changed()
+
+    def get_watched_files(self) -> list:
+        """Files the index is built from"""
+        if self.map_file.endswith(COMPACT_EXTENSION):
+            watched = [self.map_file, get_files_table(self.map_file)]
+            if self.source_map:
+                watched += get_map_files(self.source_map) + [get_sources_file(self.source_map)]
+            return watched
+        return get_map_files(self.map_file) + [get_sources_file(self.map_file)]
+
+    def get_stamp(self) -> tuple:
+        """Path and mtime of the files the index is built from"""
+        return tuple((f, os.path.getmtime(f)) for f in self.get_watched_files() if os.path.isfile(f))
+
+    def reload_if_changed(self) -> bool:
+        """Reload the map and clear the cache if its files changed since the last load
+
+        Returns:
+            - (bool) : True if the map was reloaded
         
-        # filter dataframe
-        dfpmid = df.filter(pl.col('PMID') == pmid)
-        dfup = dfpmid.filter(pl.col('Source') == 'updatefiles')
-        dfba = dfpmid.filter(pl.col('Source') == 'baseline')
-
-        # Check update files
-        if dfup.shape[0] > 0:
-            for x in list(dfup['SourceFile']):
-                if x not in updatefiles_file:
-                    updatefiles_file.append(x)
-
-        # if no updatefile, go for baseline file
-        else:
-            for x in list(dfba['SourceFile']):
-                if x not in baseline_file:
-                    baseline_file.append(x)
+        """
+        stamp = self.get_stamp()
+        if stamp == self.stamp:
+            return False
+
+        with self.lock:
+            if stamp == self.stamp:
+                return False
+            if self.map_file.endswith(COMPACT_EXTENSION):
+                # the rebuild of an outdated compact map changes the stamp
+                if refresh_compact_map(self.map_file):
+                    stamp = self.get_stamp()
+                self.entries, self.files = load_compact_map(self.map_file)
+            else:
+                entries, self.files = encode_map(self.map_file)
+                self.entries = entries.collect()
+            self.lookup_pmid = lru_cache(maxsize=self.cache_size)(self.resolve_pmid)
+            self.lookup_dates = lru_cache(maxsize=self.cache_size)(self.resolve_dates)
+            self.stamp = stamp
+
+        return True
+
+    def resolve_pmid(self, pmids:tuple) -> dict:
+        """Uncached PMID lookup, pmids is a sorted tuple of unique UInt32 pmid"""
+        return lookup_compact_map(pl.Series('PMID', pmids), self.entries, self.files)
+
+    def resolve_dates(self, min_date:str, max_date:str) -> dict:
+        """Uncached date range lookup"""
+        return lookup_compact_dates(min_date, max_date, self.entries, self.files)
 
-    return {'baseline':baseline_file, 'updatefiles':updatefiles_file}
+    def get_files_for_pmid(self, pmid_list) -> dict:
+        """Get files containing infos for pmid in pmid list, see get_files_for_pmid
+
+        Args:
+            - pmid_list (list | pl.Series | pyarrow.Array) : batch of pmid
+
+        Returns:
+            - (dict) : baseline and updatefiles containing infos for given pmid
+        
+        """
+        self.reload_if_changed()
+        pmids = to_pmid_series(pmid_list, pl.UInt32).drop_nulls().unique().sort()
+        files = self.lookup_pmid(tuple(pmids.to_list()))
+        return {source: list(file_list) for source, file_list in files.items()}
+
+    def get_files_between_date(self, min_date:str, max_date:str) -> dict:
+        """Get files containing infos for article published between min and max date, see get_files_between_date
+
+        Args:
+            - min_date (str) : min publication date
+            - max_date (str) : max publication date
+
+        Returns:
+            - (dict) : baseline and updatefiles containing infos for given dates
+        
+        """
+        self.reload_if_changed()
+        files = self.lookup_dates(min_date, max_date)
+        return {source: list(file_list) for source, file_list in files.items()}
 
 
 if __name__ == "__main__":
@@ -1,142 +1,577 @@
 import gzip
+import io
+import multiprocessing
 import xml.etree.ElementTree as ET
 import polars as pl
 import re
 import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Callable, Iterator
 
-def xml_to_df(file_path:str) -> pl.DataFrame:
-    """Parse xml.gz file into a polars dataframe
+# optional fast parser backend
+try:
+    from lxml import etree as LET
+except ImportError:
+    LET = None
+
+def format_date(date_elem:ET.Element) -> str:
+    """Assemble Year-Month-Day from a date node, missing parts are dropped
 
     Args:
-        - file_path (str) : path to pubmedxxxx.xml.gz file to parse
+        - date_elem (ET.Element) : date node (PubDate, DateRevised ...)
+
+    Returns:
+        - (str) : raw date, e.g 2025-Sep-14
+    
+    """
+    year = date_elem.findtext('Year') or ""
+    month = date_elem.findtext('Month') or ""
+    day = date_elem.findtext('Day') or ""
+    return f"{year}-{month}-{day}".strip("-")
+
+
+def extract_pmid(article:ET.Element) -> str | None:
+    """PMID of the article"""
+    pmid_elem = article.find('.//PMID')
+    return pmid_elem.text if pmid_elem is not None else None
+
+
+def extract_title(article:ET.Element) -> str:
+    """Title of the article"""
+    title_elem = article.find('.//ArticleTitle')
+    return title_elem.text if title_elem is not None else ""
+
+
+def extract_abstract(article:ET.Element) -> str:
+    """Abstract of the article, AbstractText sections joined with a space"""
+    # peut avoir plusieurs <AbstractText>
+    abstract_elems = article.findall('.//Abstract/AbstractText')
+    return " ".join([el.text for el in abstract_elems if el.text])
+
+
+def extract_publication_date_node(pub_date:ET.Element) -> str:
+    """Raw date of a PubDate node, falling back on MedlineDate when there is no Year"""
+    # pas de Year : date libre, e.g <MedlineDate>2019 Nov-Dec</MedlineDate>
+    if not pub_date.findtext('Year'):
+        return pub_date.findtext('MedlineDate') or ""
+
+    return format_date(pub_date)
+
+
+def extract_publication_date(article:ET.Element) -> str:
+    """Raw publication date of the article, normalized later by clean_df"""
+    # Year-Month-Day si dispo
+    pub_date = article.find('.//Article/Journal/JournalIssue/PubDate')
+    if pub_date is None:
+        return ""
+
+    return extract_publication_date_node(pub_date)
+
+
+def extract_revision_date(article:ET.Element) -> str:
+    """Raw revision date of the article, normalized later by clean_df"""
+    revision_date = article.find('.//MedlineCitation/DateRevised')
+    return format_date(revision_date) if revision_date is not None else ""
+
+
+def extract_mesh_term_list(article:ET.Element) -> list:
+    """MeSH descriptors of the article"""
+    mesh_terms = [mh.findtext('DescriptorName') for mh in article.findall('.//MeshHeading')]
+    return [m for m in mesh_terms if m]
+
+
+def extract_mesh_terms(article:ET.Element) -> str:
+    """MeSH descriptors of the article, joined with '; '"""
+    return "; ".join(extract_mesh_term_list(article))
+
+
+def extract_keyword_list(article:ET.Element) -> list:
+    """Keywords of the article"""
+    keywords = [kw.text for kw in article.findall('.//Keyword')]
+    return [k for k in keywords if k]
+
+
+def extract_keywords(article:ET.Element) -> str:
+    """Keywords of the article, joined with '; '"""
+    return "; ".join(extract_keyword_list(article))
+
+
+def format_authors(author_elems:list) -> list:
+    """Format Author nodes as ForeName LastName, Initials LastName as fallback"""
+    authors = []
+    for auth in author_elems:
+        last = auth.findtext('LastName') or ""
+        fore = auth.findtext('ForeName') or ""
+        initials = auth.findtext('Initials') or ""
+        fullname = " ".join([fore, last]).strip()
+        if fullname:
+            authors.append(fullname)
+        elif initials and last:  # fallback
+            authors.append(f"{initials} {last}")
+    return authors
+
+
+def extract_author_list(article:ET.Element) -> list:
+    """Authors of the article (ForeName LastName)"""
+    return format_authors(article.findall('.//Author'))
+
+
+def extract_authors(article:ET.Element) -> str:
+    """Authors of the article (ForeName LastName), joined with '; '"""
+    return "; ".join(extract_author_list(article))
+
+
+def extract_journal(article:ET.Element) -> str | None:
+    """Title of the journal"""
+    journal_title = article.findtext('.//Journal/Title')
+    return journal_title if journal_title else None
+
+
+# output columns : name -> (dtype, extractor), in column order
+# extend it with register_field
+FIELDS = {
+    "PMID": (pl.Utf8, extract_pmid),
+    "Title": (pl.Utf8, extract_title),
+    "Abstract": (pl.Utf8, extract_abstract),
+    "PublicationDate": (pl.Utf8, extract_publication_date),
+    "RevisionDate": (pl.Utf8, extract_revision_date),
+    "MeSHTerms": (pl.Utf8, extract_mesh_terms),
+    "Keywords": (pl.Utf8, extract_keywords),
+    "Authors": (pl.Utf8, extract_authors),
+    "Journal": (pl.Utf8, extract_journal),
+}
+
+# list typed version of the multi-valued columns, used when list_columns is set to True
+LIST_FIELDS = {
+    "MeSHTerms": (pl.List(pl.Utf8), extract_mesh_term_list),
+    "Keywords": (pl.List(pl.Utf8), extract_keyword_list),
+    "Authors": (pl.List(pl.Utf8), extract_author_list),
+}
+
+
+def register_field(name:str, dtype:pl.DataType, extractor:Callable[[ET.Element], object]) -> None:
+    """Register a new column that xml_to_df can extract, e.g DOI or affiliations
+    Registering an existing name replaces its extractor
+
+    Args:
+        - name (str) : name of the output column
+        - dtype (pl.DataType) : polars type of the column
+        - extractor (Callable) : function taking a PubmedArticle node and returning the value of the column
+    
+    """
+    FIELDS[name] = (dtype, extractor)
+
+
+def get_fields(columns:list=None, list_columns:bool=False) -> dict:
+    """Select the fields to extract, keep all registered fields if columns is None
+
+    Args:
+        - columns (list) : names of the columns to extract
+        - list_columns (bool) : if set to True use the List[Utf8] version of MeSHTerms, Keywords and Authors
+
+    Returns:
+        - (dict) : selected subset of FIELDS, in the requested order
+    
+    """
+    fields = dict(FIELDS)
+    if list_columns:
+        fields.update(LIST_FIELDS)
+
+    if columns is None:
+        return fields
+
+    unknown = [c for c in columns if c not in fields]
+    if unknown:
+        raise ValueError(f"Unknown column(s) {unknown}, available columns are {list(fields)}")
+
+    return {name: fields[name] for name in columns}
+
+
+def iter_articles(xml_file) -> Iterator[ET.Element]:
+    """Incrementally parse a pubmed xml stream and yield PubmedArticle nodes one at a time
+    Each article is released from the tree once the consumer moves on, so memory
+    stays flat whatever the size of the file
+
+    Args:
+        - xml_file (file object) : decompressed pubmed xml stream
+
+    Returns:
+        - (Iterator[ET.Element]) : PubmedArticle nodes
+    
+    """
+
+    context = ET.iterparse(xml_file, events=("start", "end"))
+
+    # first event is the opening of <PubmedArticleSet>
+    _, root = next(context)
+
+    for event, elem in context:
+        if event == "end" and elem.tag == "PubmedArticle":
+            yield elem
+
+            # free the article (and any DeleteCitation sibling) once processed
+            root.clear()
+
+
+def iter_articles_lxml(xml_file) -> Iterator:
+    """lxml version of iter_articles, only PubmedArticle end events are reported
+    and each article is deleted from the tree once processed
+
+    Args:
+        - xml_file (file object) : decompressed pubmed xml stream
+
+    Returns:
+        - (Iterator[lxml.etree._Element]) : PubmedArticle nodes
+    
+    """
+
+    # lxml errors hold their error log and cannot be pickled back from worker processes
+    try:
+        for _, elem in LET.iterparse(xml_file, events=("end",), tag="PubmedArticle"):
+            yield elem
+
+            # free the article and the already processed siblings
+            elem.clear(keep_tail=True)
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    except LET.XMLSyntaxError as e:
+        raise ValueError(str(e)) from None
+
+
+def get_lxml_extractors() -> dict:
+    """Build compiled XPath versions of the built-in extractors
+    Queries are anchored on the PubmedArticle layout of the pubmed DTD instead
+    of scanning every descendant of the article (reference lists, history ...)
+
+    Returns:
+        - (dict) : built-in extractor to its lxml counterpart
+    
+    """
+
+    first = lambda query: LET.XPath(f"({query})[1]")
+    pmid = first("MedlineCitation/PMID")
+    title = first("MedlineCitation/Article/ArticleTitle")
+    abstract = LET.XPath("MedlineCitation/Article/Abstract/AbstractText")
+    pub_date = first("MedlineCitation/Article/Journal/JournalIssue/PubDate")
+    revision_date = first("MedlineCitation/DateRevised")
+    mesh_terms = LET.XPath("MedlineCitation/MeshHeadingList/MeshHeading/DescriptorName[1]")
+    keywords = LET.XPath("MedlineCitation/KeywordList/Keyword")
+    authors = LET.XPath("MedlineCitation/Article/AuthorList/Author")
+    journal = first("MedlineCitation/Article/Journal/Title")
+
+    def first_text(query, default):
+        def extract(article):
+            nodes = query(article)
+            return nodes[0].text if nodes else default
+        return extract
+
+    def extract_abstract_lxml(article):
+        return " ".join([el.text for el in abstract(article) if el.text])
+
+    def extract_publication_date_lxml(article):
+        nodes = pub_date(article)
+        return extract_publication_date_node(nodes[0]) if nodes else ""
+
+    def extract_revision_date_lxml(article):
+        nodes = revision_date(article)
+        return format_date(nodes[0]) if nodes else ""
+
+    def extract_mesh_term_list_lxml(article):
+        return [el.text for el in mesh_terms(article) if el.text]
+
+    def extract_keyword_list_lxml(article):
+        return [el.text for el in keywords(article) if el.text]
+
+    def extract_author_list_lxml(article):
+        return format_authors(authors(article))
+
+    def extract_journal_lxml(article):
+        nodes = journal(article)
+        return nodes[0].text or None if nodes else None
+
+    return {
+        extract_pmid: first_text(pmid, None),
+        extract_title: first_text(title, ""),
+        extract_abstract: extract_abstract_lxml,
+        extract_publication_date: extract_publication_date_lxml,
+        extract_revision_date: extract_revision_date_lxml,
+        extract_mesh_term_list: extract_mesh_term_list_lxml,
+        extract_mesh_terms: lambda article: "; ".join(extract_mesh_term_list_lxml(article)),
+        extract_keyword_list: extract_keyword_list_lxml,
+        extract_keywords: lambda article: "; ".join(extract_keyword_list_lxml(article)),
+        extract_author_list: extract_author_list_lxml,
+        extract_authors: lambda article: "; ".join(extract_author_list_lxml(article)),
+        extract_journal: extract_journal_lxml,
+    }
+
+
+# parser backends : name -> (article iterator, built-in extractor overrides)
+BACKENDS = {"etree": (iter_articles, {})}
+if LET is not None:
+    BACKENDS["lxml"] = (iter_articles_lxml, get_lxml_extractors())
+
+
+def get_backend(backend:str=None) -> str:
+    """Resolve the parser backend to use, lxml if it is installed, etree otherwise
+
+    Args:
+        - backend (str) : requested backend (etree or lxml), None for automatic selection
+
+    Returns:
+        - (str) : name of the backend
+    
+    """
+    if backend is None:
+        return "lxml" if "lxml" in BACKENDS else "etree"
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown or unavailable parser backend {backend}, available backends are {list(BACKENDS)}")
+    return backend
+
+
+def xml_stream_to_df(xml_file, streaming:bool=True, batch_size:int=10000, columns:list=None, list_columns:bool=False, backend:str=None) -> pl.DataFrame:
+    """Parse a decompressed pubmed xml stream into a polars dataframe
+    Extracted values are appended to one buffer per column and flushed into a
+    dataframe with the schema declared in FIELDS every batch_size articles
+
+    Args:
+        - xml_file (file object) : binary stream of pubmed xml
+        - streaming (bool) : if set to True parse articles one at a time instead of loading the whole xml tree
+        - batch_size (int) : number of articles buffered before being flushed into a dataframe
+        - columns (list) : columns to extract, extractors of the other fields are never run. Default to all registered fields
+        - list_columns (bool) : if set to True MeSHTerms, Keywords and Authors are List[Utf8] columns instead of '; ' joined strings
+        - backend (str) : xml parser backend (etree or lxml), default to lxml if installed
 
     Returns:
         - (pl.DataFrame) : article dataframe
     
     """
 
+    # parser backend, its fast extractors replace the built-in ones
+    backend = get_backend(backend)
+    iter_backend, overrides = BACKENDS[backend]
+
+    # one buffer per requested column
+    fields = get_fields(columns, list_columns)
+    schema = {name: dtype for name, (dtype, _) in fields.items()}
+    buffers = {name: [] for name in fields}
+    appenders = [(buffers[name].append, overrides.get(extract, extract)) for name, (_, extract) in fields.items()]
+
+    if streaming:
+        articles = iter_backend(xml_file)
+    elif backend == "lxml":
+        try:
+            articles = LET.parse(xml_file).getroot().findall('PubmedArticle')
+        except LET.XMLSyntaxError as e:
+            raise ValueError(str(e)) from None
+    else:
+        articles = ET.parse(xml_file).getroot().findall('PubmedArticle')
+
+    frames = []
+    n_buffered = 0
+    for article in articles:
+        for append, extract in appenders:
+            append(extract(article))
+        n_buffered += 1
+
+        # flush buffers
+        if n_buffered == batch_size:
+            frames.append(pl.DataFrame(buffers, schema=schema))
+            for buffer in buffers.values():
+                buffer.clear()
+            n_buffered = 0
+
+    frames.append(pl.DataFrame(buffers, schema=schema))
+
+    return pl.concat(frames, rechunk=True)
+
 
-    records = []
+def xml_to_df(file_path:str, streaming:bool=True, batch_size:int=10000, columns:list=None, list_columns:bool=False, backend:str=None) -> pl.DataFrame:
+    """Parse xml.gz file into a polars dataframe, see xml_stream_to_df
+
+    Args:
+        - file_path (str) : path to pubmedxxxx.xml.gz file to parse
+        - streaming (bool) : if set to True parse articles one at a time instead of loading the whole xml tree
+        - batch_size (int) : number of articles buffered before being flushed into a dataframe
+        - columns (list) : columns to extract, extractors of the other fields are never run. Default to all registered fields
+        - list_columns (bool) : if set to True MeSHTerms, Keywords and Authors are List[Utf8] columns instead of '; ' joined strings
+        - backend (str) : xml parser backend (etree or lxml), default to lxml if installed
+
+    Returns:
+        - (pl.DataFrame) : article dataframe
+    
+    """
 
     with gzip.open(file_path, 'rb') as f:
-        tree = ET.parse(f)
-        root = tree.getroot()
-
-        for article in root.findall('PubmedArticle'):
-            data = {}
-
-            # PMID
-            pmid_elem = article.find('.//PMID')
-            data['PMID'] = pmid_elem.text if pmid_elem is not None else None
-
-            # Titre
-            title_elem = article.find('.//ArticleTitle')
-            data['Title'] = title_elem.text if title_elem is not None else ""
-
-            # Abstract (peut avoir plusieurs <AbstractText>)
-            abstract_elems = article.findall('.//Abstract/AbstractText')
-            if abstract_elems:
-                data['Abstract'] = " ".join([el.text for el in abstract_elems if el.text])
-            else:
-                data['Abstract'] = ""
-
-            # Date de publication (Year-Month-Day si dispo)
-            pub_date = article.find('.//Article/Journal/JournalIssue/PubDate')
-            if pub_date is not None:
-                year = pub_date.findtext('Year') or ""
-                month = pub_date.findtext('Month') or ""
-                day = pub_date.findtext('Day') or ""
-                data['PublicationDate'] = f"{year}-{month}-{day}".strip("-")
-            else:
-                data['PublicationDate'] = ""
-
-            # Date de révision / update
-            revision_date = article.find('.//MedlineCitation/DateRevised')
-            if revision_date is not None:
-                year = revision_date.findtext('Year') or ""
-                month = revision_date.findtext('Month') or ""
-                day = revision_date.findtext('Day') or ""
-                data['RevisionDate'] = f"{year}-{month}-{day}".strip("-")
-            else:
-                data['RevisionDate'] = ""
-
-            # MeSH Terms
-            mesh_terms = [mh.findtext('DescriptorName') for mh in article.findall('.//MeshHeading')]
-            data['MeSHTerms'] = "; ".join([m for m in mesh_terms if m])
-
-            # Keywords
-            keywords = [kw.text for kw in article.findall('.//Keyword')]
-            data['Keywords'] = "; ".join([k for k in keywords if k])
-
-            # Auteurs
-            authors = []
-            for auth in article.findall('.//Author'):
-                last = auth.findtext('LastName') or ""
-                fore = auth.findtext('ForeName') or ""
-                initials = auth.findtext('Initials') or ""
-                fullname = " ".join([fore, last]).strip()
-                if fullname:
-                    authors.append(fullname)
-                elif initials and last:  # fallback
-                    authors.append(f"{initials} {last}")
-            data['Authors'] = "; ".join(authors)
-
-            # Journal
-            journal_title = article.findtext('.//Journal/Title')
-            data['Journal'] = journal_title if journal_title else None
-
-            records.append(data)
-
-    return pl.DataFrame(records)
+        return xml_stream_to_df(f, streaming, batch_size, columns, list_columns, backend)
+
 
+def split_articles(xml_bytes:bytes, n_chunks:int) -> list:
+    """Split a decompressed pubmed xml file into standalone xml documents holding
+    consecutive <PubmedArticle> elements, using a byte scan of the article boundaries
+
+    Args:
+        - xml_bytes (bytes) : content of the decompressed xml file
+        - n_chunks (int) : number of chunks to produce (at most)
+
+    Returns:
+        - (list) : list of xml documents (bytes), in the original article order
+    
+    """
+
+    # articles span from the first opening tag to the last closing tag
+    start = xml_bytes.find(b"<PubmedArticle>")
+    if start == -1:
+        return []
+    end = xml_bytes.rfind(b"</PubmedArticle>") + len(b"</PubmedArticle>")
+
+    # cut at the first article starting after each evenly spaced offset
+    chunk_size = max(1, (end - start) // n_chunks)
+    bounds = [start]
+    while True:
+        cut = xml_bytes.find(b"<PubmedArticle>", bounds[-1] + chunk_size, end)
+        if cut == -1:
+            break
+        bounds.append(cut)
+    bounds.append(end)
+
+    return [b"<PubmedArticleSet>" + xml_bytes[a:b] + b"</PubmedArticleSet>" for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def parse_chunk(chunk:bytes, columns:list=None, list_columns:bool=False, backend:str=None) -> pl.DataFrame:
+    """Parse a chunk produced by split_articles, run in worker processes
+
+    Args:
+        - chunk (bytes) : standalone xml document of PubmedArticle elements
+        - columns (list) : columns to extract, default to all registered fields
+        - list_columns (bool) : if set to True MeSHTerms, Keywords and Authors are List[Utf8] columns
+        - backend (str) : parser backend (etree or lxml), default to the fastest available one
+
+    Returns:
+        - (pl.DataFrame) : article dataframe
+    
+    """
+    return xml_stream_to_df(io.BytesIO(chunk), columns=columns, list_columns=list_columns, backend=backend)
+
+
+def xml_to_df_parallel(file_path:str, workers:int=None, columns:list=None, list_columns:bool=False, backend:str=None) -> pl.DataFrame:
+    """Parse a single xml.gz file with a pool of processes
+    The file is decompressed once, split on <PubmedArticle> boundaries and the
+    partial dataframes are concatenated back in the original order
+
+    Args:
+        - file_path (str) : path to pubmedxxxx.xml.gz file to parse
+        - workers (int) : number of processes, default to the number of cpu
+        - columns (list) : columns to extract, default to all registered fields
+        - list_columns (bool) : if set to True MeSHTerms, Keywords and Authors are List[Utf8] columns
+        - backend (str) : parser backend (etree or lxml), default to the fastest available one
+
+    Returns:
+        - (pl.DataFrame) : article dataframe
+    
+    """
+
+    # resolved once, so that every chunk is parsed by the same backend
+    backend = get_backend(backend)
+    workers = workers or os.cpu_count() or 1
+    with gzip.open(file_path, 'rb') as f:
+        chunks = split_articles(f.read(), 4 * workers)
+    if not chunks:
+        return xml_stream_to_df(io.BytesIO(b"<PubmedArticleSet></PubmedArticleSet>"), columns=columns, list_columns=list_columns, backend=backend)
+
+    # spawned workers, forking a process already running polars can deadlock them
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        frames = list(executor.map(parse_chunk, chunks, repeat(columns), repeat(list_columns), repeat(backend)))
+
+    return pl.concat(frames, rechunk=True)
+
+
+# month names found in pubmed dates
+MONTH_MAP = {
+    "jan": "01",
+    "feb": "02",
+    "mar": "03",
+    "apr": "04",
+    "may": "05",
+    "jun": "06",
+    "jul": "07",
+    "aug": "08",
+    "sep": "09",
+    "sept": "09",
+    "oct": "10",
+    "nov": "11",
+    "dec": "12"
+}
+
+# année, mois (texte ou numérique) et jour éventuels, e.g 2025-sep-14, 2023-09-14, 2019 Nov-Dec
+DATE_PATTERN = r"^(?P<year>\d{4})\b(?:[- ]+(?P<month>[A-Za-z]+|\d{1,2}\b)(?:[- ]+(?P<day>\d{1,2})\b)?)?"
 
 
 def normalize_pubdate(date_str: str) -> str | None:
     """Convert str date parsed from original xml data to proper datetime
+    Row-wise counterpart of normalize_date_expr, kept for use outside of polars
 
     Args:
-        - date_str (str) : strange date format, e.g 2025-sep-14
+        - date_str (str) : strange date format, e.g 2025-sep-14 or 2019 Nov-Dec
     
     """
     if not date_str:
         return None
 
-    # params
-    month_map = {
-        "jan": "01",
-        "feb": "02",
-        "mar": "03",
-        "apr": "04",
-        "may": "05",
-        "jun": "06",
-        "jul": "07",
-        "aug": "08",
-        "sep": "09",
-        "sept": "09",
-        "oct": "10",
-        "nov": "11",
-        "dec": "12"
-    }
-
     # capture année, mois, jour éventuel
-    parts = re.split(r"[- ]", date_str.strip())
-    if len(parts) == 1:
-        # cas: juste l'année
-        year = parts[0]
-        return f"{year}-01-01"
-    elif len(parts) == 2:
-        # cas: année + mois
-        year, month = parts
-        month_num = month_map.get(month.lower(), "01")
-        return f"{year}-{month_num}-01"
-    elif len(parts) >= 3:
-        # cas: année + mois + jour
-        year, month, day = parts[:3]
-        month_num = month_map.get(month.lower(), "01")
-        # pad le jour à 2 chiffres
-        day = day.zfill(2)
-        return f"{year}-{month_num}-{day}"
-    return None
+    match = re.match(DATE_PATTERN, date_str.strip())
+    if match is None:
+        return None
+    year, month, day = match.group("year", "month", "day")
+
+    # mois manquant ou inconnu -> janvier
+    if month is None:
+        month_num = "01"
+    elif month.isdigit():
+        month_num = month.zfill(2)
+    else:
+        month_num = MONTH_MAP.get(month.lower(), "01")
+
+    # jour manquant (ou intervalle, e.g Nov-Dec) -> premier du mois
+    day = day.zfill(2) if day else "01"
+
+    return f"{year}-{month_num}-{day}"
+
+
+def normalize_date_expr(column:str) -> pl.Expr:
+    """Vectorized version of normalize_pubdate, return a polars expression
+    turning the raw date column into a pl.Date column
+
+    Args:
+        - column (str) : name of the column containing raw dates
+
+    Returns:
+        - (pl.Expr) : normalized date expression
+    
+    """
+
+    # capture année, mois, jour éventuel (single regex pass)
+    parts = pl.col(column).str.strip_chars().str.to_lowercase().str.extract_groups(DATE_PATTERN)
+
+    # map month to its number (unknown month name -> janvier), missing day -> premier du mois
+    # numeric months are kept as is, out of range ones (e.g 13) give a null date like normalize_pubdate
+    month = pl.field("month")
+    parts = parts.struct.with_fields(
+        pl.when(month.str.contains(r"^\d+$"))
+        .then(month.str.zfill(2))
+        .otherwise(month.replace_strict(MONTH_MAP, default="01", return_dtype=pl.Utf8))
+        .fill_null("01"),
+        pl.field("day").str.zfill(2).fill_null("01")
+    )
+
+    return (
+        parts.struct.with_fields(
+            pl.concat_str([pl.field("year"), pl.field("month"), pl.field("day")], separator="-").alias("date")
+        )
+        .struct.field("date")
+        .str.strptime(pl.Date, "%Y-%m-%d", strict=False)
+        .alias(column)
+    )
 
 
 def clean_df(df:pl.DataFrame) -> pl.DataFrame:
@@ -150,38 +585,33 @@ def clean_df(df:pl.DataFrame) -> pl.DataFrame:
     
     """
 
-    # deal with publication date
+    # deal with publication and revision date, if extracted
     df = df.with_columns(
-        pl.col("PublicationDate")
-        .map_elements(normalize_pubdate, return_dtype=pl.Utf8)
-        .str.strptime(pl.Date, "%Y-%m-%d", strict=False)
-        .alias("PublicationDate")
-    )
-
-    # deal with revision date
-    df = df.with_columns(
-        pl.col("RevisionDate")
-        .map_elements(normalize_pubdate, return_dtype=pl.Utf8)
-        .str.strptime(pl.Date, "%Y-%m-%d", strict=False)
-        .alias("RevisionDate")
+        [normalize_date_expr(c) for c in ("PublicationDate", "RevisionDate") if c in df.columns]
     )
 
     # return cleaned df
     return df
 
 
-def xml_to_parquet(pubmed_file:str, parquet_file:str, drop:bool) -> None:
+def xml_to_parquet(pubmed_file:str, parquet_file:str, drop:bool, columns:list=None, list_columns:bool=False, workers:int=1) -> None:
     """Convert xml file to parquet
 
     Args:
         - pubmed_file (str) : xml.gz file containing data
         - parquet_file (str) : path to save parquet file
         - drop (bool) : if set to True delete xml.gz and md5 file if exists
+        - columns (list) : columns to extract, default to all registered fields
+        - list_columns (bool) : if set to True store MeSHTerms, Keywords and Authors as List[Utf8] columns
+        - workers (int) : if greater than 1, parse the file with xml_to_df_parallel using that many processes
     
     """
 
     # extract dataframe
-    df = xml_to_df(pubmed_file)
+    if workers > 1:
+        df = xml_to_df_parallel(pubmed_file, workers, columns, list_columns)
+    else:
+        df = xml_to_df(pubmed_file, columns=columns, list_columns=list_columns)
 
     # clean df
     df = clean_df(df)
@@ -196,18 +626,23 @@ def xml_to_parquet(pubmed_file:str, parquet_file:str, drop:bool) -> None:
             os.remove(f"{pubmed_file}.md5")
         
         
-def xml_to_csv(pubmed_file:str, csv_file:str, drop:bool) -> None:
+def xml_to_csv(pubmed_file:str, csv_file:str, drop:bool, columns:list=None, workers:int=1) -> None:
     """Convert xml file to csv
 
     Args:
         - pubmed_file (str) : xml.gz file containing data
         - csv_file (str) : path to save csv file
         - drop (bool) : if set to True delete xml.gz and md5 file if exists
+        - columns (list) : columns to extract, default to all registered fields
+        - workers (int) : if greater than 1, parse the file with xml_to_df_parallel using that many processes
     
     """
 
     # extract dataframe
-    df = xml_to_df(pubmed_file)
+    if workers > 1:
+        df = xml_to_df_parallel(pubmed_file, workers, columns)
+    else:
+        df = xml_to_df(pubmed_file, columns=columns)
 
     # clean df
     df = clean_df(df)
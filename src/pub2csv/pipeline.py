@@ -0,0 +1,412 @@
+import gzip
+import hashlib
+import io
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from functools import partial
+import polars as pl
+from tqdm import tqdm
+
+from .download import get_ftp_connection, download_pubmed_file, commit_download, check_md5, BLOCK_SIZE
+from .batch import convert_file
+from .parser import xml_stream_to_df, clean_df
+from .state import update_file_state, now, DOWNLOADED, DONE, FAILED
+
+
+class QueueReader(io.RawIOBase):
+    """Read only binary stream over the chunks pushed in a queue by a ftp transfer
+    None marks the end of the stream, an exception is raised to the reader"""
+
+    def __init__(self, chunks:queue.Queue):
+        self.chunks = chunks
+        self.chunk = memoryview(b"")
+        self.eof = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self.chunk and not self.eof:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.eof = True
+            elif isinstance(chunk, Exception):
+                raise chunk
+            else:
+                self.chunk = memoryview(chunk)
+        n = min(len(buffer), len(self.chunk))
+        buffer[:n] = self.chunk[:n]
+        self.chunk = self.chunk[n:]
+        return n
+
+
+def stream_file_to_parquet(ncbi_server_address:str, folder_location:str, gz_file:str, output_folder:str, block_size:int=BLOCK_SIZE, port:int=21) -> tuple:
+    """Download, check and convert a pubmed file without writing the xml.gz to disk
+    The ftp byte stream is hashed and decompressed on the fly into the incremental
+    xml parser, the parquet file is only written if the md5 matches
+
+    Args:
+        - ncbi_server_address (str) : ftp adress of ncbi server
+        - folder_location (str) : place where files are stored on the ftp server
+        - gz_file (str) : name of the xml.gz file to process
+        - output_folder (str) : folder to store the parquet file
+        - block_size (int) : size of the blocks read from the connection, in bytes
+        - port (int) : ftp port of the server
+
+    Returns:
+        - (tuple) : path to the parquet file and md5 hash of the xml.gz file
+    
+    """
+
+    ftp = get_ftp_connection(ncbi_server_address, folder_location, port)
+    try:
+        # expected hash
+        md5_lines = []
+        ftp.retrlines(f"RETR {gz_file}.md5", md5_lines.append)
+        hash_expected = " ".join(md5_lines).strip().split()[1]
+
+        # transfer in a background thread, chunks are hashed then handed to the parser
+        hasher = hashlib.md5()
+        chunks = queue.Queue(maxsize=64)
+        stop = threading.Event()
+
+        def push(item) -> None:
+            while not stop.is_set():
+                try:
+                    chunks.put(item, timeout=1)
+                    return
+                except queue.Full:
+                    pass
+            raise InterruptedError("stream closed by the parser")
+
+        def callback(chunk:bytes) -> None:
+            hasher.update(chunk)
+            push(chunk)
+
+        def transfer() -> None:
+            try:
+                ftp.retrbinary(f"RETR {gz_file}", callback, block_size)
+                push(None)
+            except InterruptedError:
+                pass
+            except Exception as e:
+                try:
+                    push(e)
+                except InterruptedError:
+                    pass
+
+        transfer_thread = threading.Thread(target=transfer, daemon=True)
+        transfer_thread.start()
+        try:
+            with gzip.GzipFile(fileobj=io.BufferedReader(QueueReader(chunks), block_size)) as f:
+                df = xml_stream_to_df(f)
+
+                # consume the end of the stream so that the whole file is hashed
+                while f.read(block_size):
+                    pass
+        finally:
+            stop.set()
+            transfer_thread.join()
+    finally:
+        ftp.close()
+
+    # check
+    hash_computed = hasher.hexdigest()
+    if hash_computed != hash_expected:
+        raise ValueError(f"md5 mismatch for {gz_file}")
+
+    # commit parquet file
+    parquet_file = f"{output_folder}/{gz_file.replace('.xml.gz', '.parquet')}"
+    clean_df(df).write_parquet(f"{parquet_file}.tmp")
+    os.replace(f"{parquet_file}.tmp", parquet_file)
+
+    return parquet_file, hash_computed
+
+
+def run_streaming_pipeline(file_list:list, ncbi_server_address:str, folder_location:str, output_folder:str, max_retries:int, n_workers:int=2, desc:str="Extracting Data", state_file:str=None, port:int=21) -> list:
+    """Process a list of pubmed files with stream_file_to_parquet in a pool of processes,
+    each worker holding its own ftp connection. No xml.gz file is written to disk
+
+    Args:
+        - file_list (list) : list of xml.gz files to process
+        - ncbi_server_address (str) : ftp adress of ncbi server
+        - folder_location (str) : place where files are stored on the ftp server
+        - output_folder (str) : folder to store files parsed as parquet
+        - max_retries (int) : number of attempts authorized for a file
+        - n_workers (int) : number of processes, i.e of parallel ftp connections
+        - desc (str) : description displayed by the progress bar
+        - state_file (str) : if provided, progress of each file is recorded in this sqlite state database
+        - port (int) : ftp port of the server
+
+    Returns:
+        - (list) : files that could not be processed
+    
+    """
+
+    failed = []
+    attempts = {gz_file: 1 for gz_file in file_list}
+    progress = tqdm(total=len(file_list), desc=desc)
+    with ProcessPoolExecutor(max_workers=max(1, n_workers), mp_context=multiprocessing.get_context("spawn")) as executor:
+        pending = {
+            executor.submit(stream_file_to_parquet, ncbi_server_address, folder_location, gz_file, output_folder, BLOCK_SIZE, port): gz_file
+            for gz_file in file_list
+        }
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                gz_file = pending.pop(future)
+
+                # success
+                if future.exception() is None:
+                    if state_file:
+                        parquet_file, hash_computed = future.result()
+                        row_count = pl.scan_parquet(parquet_file).select(pl.len()).collect().item()
+                        update_file_state(state_file, folder_location, gz_file, DONE, md5=hash_computed, downloaded_at=now(), parquet_path=parquet_file, row_count=row_count, error=None)
+                    progress.update(1)
+
+                # retry
+                elif attempts[gz_file] < max_retries:
+                    attempts[gz_file] += 1
+                    pending[executor.submit(stream_file_to_parquet, ncbi_server_address, folder_location, gz_file, output_folder, BLOCK_SIZE, port)] = gz_file
+
+                # give up
+                else:
+                    tqdm.write(f"[!] Failed to process {gz_file} : {future.exception()}")
+                    if state_file:
+                        update_file_state(state_file, folder_location, gz_file, FAILED, error=str(future.exception()))
+                    failed.append(gz_file)
+                    progress.update(1)
+
+    progress.close()
+
+    return failed
+
+
+def download_worker(ncbi_server_address:str, folder_location:str, destination_folder:str, tasks:queue.Queue, downloaded:queue.Queue, port:int=21) -> None:
+    """Download stage, pull file names from tasks and push them to downloaded once on disk
+    Each worker holds its own ftp connection and reconnect after a failure
+
+    Args:
+        - ncbi_server_address (str) : ftp adress of ncbi server
+        - folder_location (str) : place where files are stored on the ftp server
+        - destination_folder (str) : folder to save pubmed file and md5 file
+        - tasks (queue.Queue) : (file name, attempt) to download, None to stop the worker
+        - downloaded (queue.Queue) : bounded queue of (file name, attempt, error, md5 computed during transfer) passed to verification
+        - port (int) : ftp port of the server
+    
+    """
+
+    ftp = None
+    while True:
+        task = tasks.get()
+        if task is None:
+            break
+        gz_file, attempt = task
+
+        error = None
+        hash_computed = None
+        try:
+            if ftp is None:
+                ftp = get_ftp_connection(ncbi_server_address, folder_location, port)
+            hash_computed = download_pubmed_file(gz_file, destination_folder, ftp)
+        except Exception as e:
+            error = str(e)
+
+            # drop the connection, a new one is opened for the next file
+            if ftp is not None:
+                try:
+                    ftp.close()
+                except:
+                    pass
+            ftp = None
+
+        # block while the verification / parsing stages are behind
+        downloaded.put((gz_file, attempt, error, hash_computed))
+
+    if ftp is not None:
+        ftp.close()
+
+
+def remove_downloaded_files(destination_folder:str, gz_file:str) -> None:
+    """Remove xml.gz, partial xml.gz and md5 file of a failed download
+
+    Args:
+        - destination_folder (str) : folder where pubmed file and md5 file were saved
+        - gz_file (str) : name of the xml.gz file
+    
+    """
+    for f in (f"{destination_folder}/{gz_file}", f"{destination_folder}/{gz_file}.part", f"{destination_folder}/{gz_file}.md5"):
+        if os.path.isfile(f):
+            os.remove(f)
+
+
+def is_verified_download(destination_folder:str, gz_file:str) -> bool:
+    """Check if a previous run left a verified but unparsed xml.gz file on disk
+    The part file is only renamed once its md5 matched, the hash is checked again
+    in case the file was altered since
+
+    Args:
+        - destination_folder (str) : folder where pubmed file and md5 file were saved
+        - gz_file (str) : name of the xml.gz file
+
+    Returns:
+        - (bool) : True if the xml.gz file can be parsed without downloading it again
+    
+    """
+    local_file = f"{destination_folder}/{gz_file}"
+    if not os.path.isfile(local_file) or not os.path.isfile(f"{local_file}.md5"):
+        return False
+    try:
+        return check_md5(local_file, f"{local_file}.md5")
+    except Exception:
+        return False
+
+
+def record_conversion(state_file:str, folder_location:str, gz_file:str, future:Future) -> None:
+    """Save the outcome of a parsing job in the state database
+
+    Args:
+        - state_file (str) : path to the sqlite state database
+        - folder_location (str) : place where files are stored on the ftp server
+        - gz_file (str) : name of the converted xml.gz file
+        - future (Future) : finished parsing job, its result is the parquet path
+    
+    """
+    if future.exception() is not None:
+        update_file_state(state_file, folder_location, gz_file, FAILED, error=str(future.exception()))
+    else:
+        parquet_file = future.result()
+        row_count = pl.scan_parquet(parquet_file).select(pl.len()).collect().item()
+        update_file_state(state_file, folder_location, gz_file, DONE, parquet_path=parquet_file, row_count=row_count, error=None)
+
+
+def run_pipeline(file_list:list, ncbi_server_address:str, folder_location:str, output_folder:str, max_retries:int, n_download:int=2, n_parse:int=None, queue_size:int=4, desc:str="Extracting Data", state_file:str=None, stream:bool=False, port:int=21) -> list:
+    """Download, check and convert to parquet a list of pubmed files with overlapping stages
+    Download workers feed a bounded queue consumed by the md5 verification, verified
+    files are parsed by a pool of processes. At most n_download + queue_size + 2 * n_parse
+    xml.gz files are on disk at the same time. Files verified by an interrupted run
+    are parsed without being downloaded again
+
+    Args:
+        - file_list (list) : list of xml.gz files to process
+        - ncbi_server_address (str) : ftp adress of ncbi server
+        - folder_location (str) : place where files are stored on the ftp server
+        - output_folder (str) : folder to store downloaded files parsed as parquet
+        - max_retries (int) : number of attempts authorized to download a file
+        - n_download (int) : number of parallel downloads (one ftp connection each)
+        - n_parse (int) : number of parsing processes, default to the number of cpu
+        - queue_size (int) : max number of downloaded files waiting for verification
+        - desc (str) : description displayed by the progress bar
+        - state_file (str) : if provided, progress of each file is recorded in this sqlite state database
+        - stream (bool) : if set to True parse files straight from the network with n_download workers, see run_streaming_pipeline
+        - port (int) : ftp port of the server, e.g to use a local mirror
+
+    Returns:
+        - (list) : files that could not be downloaded or converted
+    
+    """
+
+    if not file_list:
+        return []
+
+    if stream:
+        return run_streaming_pipeline(file_list, ncbi_server_address, folder_location, output_folder, max_retries, n_download, desc, state_file, port)
+
+    # files downloaded and verified by an interrupted run are only parsed
+    resumed = [gz_file for gz_file in file_list if is_verified_download(output_folder, gz_file)]
+    to_download = [gz_file for gz_file in file_list if gz_file not in resumed]
+
+    # init queues
+    tasks = queue.Queue()
+    downloaded = queue.Queue(maxsize=queue_size)
+    for gz_file in to_download:
+        tasks.put((gz_file, 1))
+
+    # start download stage
+    n_download = max(1, min(n_download, len(to_download)))
+    downloaders = [
+        threading.Thread(target=download_worker, args=(ncbi_server_address, folder_location, output_folder, tasks, downloaded, port), daemon=True)
+        for _ in range(n_download)
+    ]
+    for downloader in downloaders:
+        downloader.start()
+
+    # limit the number of verified files waiting for a parser
+    n_parse = n_parse or os.cpu_count() or 1
+    parse_slots = threading.BoundedSemaphore(2 * n_parse)
+
+    failed = []
+    futures = {}
+    progress = tqdm(total=len(file_list), desc=desc)
+    # parsers are spawned, a child forked from a process already running polars threads can deadlock
+    with ProcessPoolExecutor(max_workers=n_parse, mp_context=multiprocessing.get_context("spawn")) as executor:
+
+        def submit_parse(gz_file:str) -> None:
+            parse_slots.acquire()
+            future = executor.submit(
+                convert_file,
+                f"{output_folder}/{gz_file}",
+                f"{output_folder}/{gz_file.replace('.xml.gz', '.parquet')}",
+                "parquet",
+                True
+            )
+            future.add_done_callback(lambda _: parse_slots.release())
+            future.add_done_callback(lambda _: progress.update(1))
+            if state_file:
+                future.add_done_callback(partial(record_conversion, state_file, folder_location, gz_file))
+            futures[future] = gz_file
+
+        # parse stage of resumed files
+        for gz_file in resumed:
+            submit_parse(gz_file)
+
+        # verification stage
+        remaining = len(to_download)
+        while remaining:
+            gz_file, attempt, error, hash_computed = downloaded.get()
+
+            # a malformed md5 file goes through the retry path instead of stopping the run
+            verified = False
+            if error is None:
+                try:
+                    verified = commit_download(gz_file, output_folder, hash_computed)
+                except Exception as e:
+                    error = f"md5 check failed : {e!r}"
+
+            if verified:
+                if state_file:
+                    update_file_state(state_file, folder_location, gz_file, DOWNLOADED, md5=hash_computed, downloaded_at=now())
+                submit_parse(gz_file)
+                remaining -= 1
+            else:
+                # an interrupted transfer keeps its part file and is resumed by the next attempt
+                if attempt < max_retries:
+                    tasks.put((gz_file, attempt + 1))
+                else:
+                    remove_downloaded_files(output_folder, gz_file)
+                    failed.append(gz_file)
+                    if state_file:
+                        update_file_state(state_file, folder_location, gz_file, FAILED, error=error or "md5 mismatch")
+                    progress.update(1)
+                    remaining -= 1
+
+        # stop download stage
+        for _ in downloaders:
+            tasks.put(None)
+
+        # wait for parsing stage
+        wait(futures)
+
+    progress.close()
+
+    # collect parsing failures
+    for future, gz_file in futures.items():
+        if future.exception() is not None:
+            tqdm.write(f"[!] Failed to convert {gz_file} : {future.exception()}")
+            remove_downloaded_files(output_folder, gz_file)
+            failed.append(gz_file)
+
+    return failed
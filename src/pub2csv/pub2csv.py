@@ -1,16 +1,17 @@
 import glob
 import polars as pl
-from tqdm import tqdm
 import os
 import shutil
 
-from .download import get_list_of_pubmed_files, get_files_between_date, download_file_list, download_and_check, check_folder_capacity, get_ftp_connection
-from .parser import xml_to_df, clean_df, xml_to_parquet
+from .download import get_list_of_pubmed_files, get_files_between_date, download_file_list, check_folder_capacity, get_remote_manifest
+from .parser import xml_to_df, clean_df
 from .filter import filter_date
-from .mapper import get_files_for_pmid
+from .pipeline import run_pipeline
+from .state import sync_state, get_work_set
+from .mapper import get_files_for_pmid, to_pmid_series
 
 
-def get_baseline_data(output_folder:str, max_retries:int, override:bool) -> None:
+def get_baseline_data(output_folder:str, max_retries:int, override:bool, n_download:int=2, n_parse:int=None, stream:bool=False) -> None:
     """Download the content of baseline pubmed folder into output folder
     Can take a while, a lot of files to download
 
@@ -18,6 +19,9 @@ def get_baseline_data(output_folder:str, max_retries:int, override:bool) -> None
         - output_folder (str) : name of the folder to store downloaded files parsed as parquet
         - max_retries (int) : number of attempts authorized to download files
         - override (bool) : if True clean output folder if exist, if False just download the missing files from output folder
+        - n_download (int) : number of parallel downloads
+        - n_parse (int) : number of parsing processes, default to the number of cpu
+        - stream (bool) : if set to True parse files straight from the network, no xml.gz is written to disk
     """
 
     # parameters
@@ -25,58 +29,33 @@ def get_baseline_data(output_folder:str, max_retries:int, override:bool) -> None
     folder_location = "/pubmed/baseline/"
 
     # clean output folder if it already exist and override is set to True
-    if override and os.path.isidir(output_folder):
+    if override and os.path.isdir(output_folder):
         shutil.rmtree(output_folder)
 
     # init output folder
-    dl_files = []
     if not os.path.isdir(output_folder):
         os.mkdir(output_folder)
-    else:
-        processed_files = glob.glob(f"{output_folder}/*.parquet")
-        for pf in processed_files:
-            dl_files.append(pf.replace(".parquet", ".xml.gz").split("/")[-1])
 
-    # check volume capacity
-    if not check_folder_capacity(output_folder, 16):
+    # check volume capacity, streamed files never touch the disk
+    if not stream and not check_folder_capacity(output_folder, 16):
         print(f"[!] Not enough space to write in folder {output_folder}")
         return None
 
-    # create ftp connection
-    ftp = get_ftp_connection(ncbi_server_address, folder_location)
-
-    # get list of files to download
-    file_list = []
-    all_files = get_list_of_pubmed_files(ftp)
-    for af in all_files:
-        if af not in dl_files:
-            file_list.append(af)
-
-    # init loop parameter
-    to_retry = file_list
-    attempts = 0
+    # get list of files to download, remote listing is cached in the output folder
+    manifest = get_remote_manifest(ncbi_server_address, folder_location, f"{output_folder}/manifest.json")
+    all_files = sorted(manifest)
+    state_file = f"{output_folder}/state.sqlite"
+    sync_state(state_file, folder_location, manifest, output_folder)
+    file_list = get_work_set(state_file, folder_location)
 
     # collect data
-    while to_retry and attempts < max_retries:
-        failed = []
-        for gz_file in tqdm(to_retry, desc=f"[Attempt {attempts+1}] Extracting Baseline Data"):
-            if download_and_check(gz_file, output_folder, ftp):
-                xml_to_parquet(f"{output_folder}/{gz_file}", f"{output_folder}/{gz_file.replace('.xml.gz', '.parquet')}", True)
-            else:
-                failed.append(gz_file)
-
-        # update loop parameter
-        to_retry = failed
-        attempts +=1
+    to_retry = run_pipeline(file_list, ncbi_server_address, folder_location, output_folder, max_retries, n_download, n_parse, desc="Extracting Baseline Data", state_file=state_file, stream=stream)
 
     # display missing files
     if to_retry:
-        print(f"[!]Failed to download the following files after {attempts} attempts:")
+        print(f"[!]Failed to download the following files after {max_retries} attempts:")
         for gz_file in to_retry:
             print(f"\t- {gz_file}")
-
-    # close ftp connection
-    ftp.close()
     
     # display coverage
     coverage = float( (len(all_files) - len(to_retry)) / len(all_files) ) *100.0
@@ -84,7 +63,7 @@ def get_baseline_data(output_folder:str, max_retries:int, override:bool) -> None
 
 
 
-def get_updatefiles_data(output_folder:str, max_retries:int, override:bool) -> None:
+def get_updatefiles_data(output_folder:str, max_retries:int, override:bool, n_download:int=2, n_parse:int=None, stream:bool=False) -> None:
     """Download the content of updatefiles pubmed folder into output folder
     Can take a while, a lot of files to download
 
@@ -92,6 +71,9 @@ def get_updatefiles_data(output_folder:str, max_retries:int, override:bool) -> N
         - output_folder (str) : name of the folder to store downloaded files parsed as parquet
         - max_retries (int) : number of attempts authorized to download files
         - override (bool) : if True clean output folder if exist, if False just download the missing files from output folder
+        - n_download (int) : number of parallel downloads
+        - n_parse (int) : number of parsing processes, default to the number of cpu
+        - stream (bool) : if set to True parse files straight from the network, no xml.gz is written to disk
     """
 
     # parameters
@@ -99,65 +81,40 @@ def get_updatefiles_data(output_folder:str, max_retries:int, override:bool) -> N
     folder_location = "/pubmed/updatefiles/"
 
     # clean output folder if it already exist and override is set to True
-    if override and os.path.isidir(output_folder):
+    if override and os.path.isdir(output_folder):
         shutil.rmtree(output_folder)
 
     # init output folder
-    dl_files = []
     if not os.path.isdir(output_folder):
         os.mkdir(output_folder)
-    else:
-        processed_files = glob.glob(f"{output_folder}/*.parquet")
-        for pf in processed_files:
-            dl_files.append(pf.replace(".parquet", ".xml.gz").split("/")[-1])
 
-    # check volume capacity
-    if not check_folder_capacity(output_folder, 16):
+    # check volume capacity, streamed files never touch the disk
+    if not stream and not check_folder_capacity(output_folder, 16):
         print(f"[!] Not enough space to write in folder {output_folder}")
         return None
 
-    # create ftp connection
-    ftp = get_ftp_connection(ncbi_server_address, folder_location)
-
-    # get list of files to download
-    file_list = []
-    all_files = get_list_of_pubmed_files(ftp)
-    for af in all_files:
-        if af not in dl_files:
-            file_list.append(af)
-
-    # init loop parameter
-    to_retry = file_list
-    attempts = 0
+    # get list of files to download, remote listing is cached in the output folder
+    manifest = get_remote_manifest(ncbi_server_address, folder_location, f"{output_folder}/manifest.json")
+    all_files = sorted(manifest)
+    state_file = f"{output_folder}/state.sqlite"
+    sync_state(state_file, folder_location, manifest, output_folder)
+    file_list = get_work_set(state_file, folder_location)
 
     # collect data
-    while to_retry and attempts < max_retries:
-        failed = []
-        for gz_file in tqdm(to_retry, desc=f"[Attempt {attempts+1}] Extracting UpdateFiles Data"):
-            if download_and_check(gz_file, output_folder, ftp):
-                xml_to_parquet(f"{output_folder}/{gz_file}", f"{output_folder}/{gz_file.replace('.xml.gz', '.parquet')}", True)
-            else:
-                failed.append(gz_file)
-
-        # update loop parameter
-        to_retry = failed
-        attempts +=1
+    to_retry = run_pipeline(file_list, ncbi_server_address, folder_location, output_folder, max_retries, n_download, n_parse, desc="Extracting UpdateFiles Data", state_file=state_file, stream=stream)
 
     # display missing files
     if to_retry:
-        print(f"[!]Failed to download the following files after {attempts} attempts:")
+        print(f"[!]Failed to download the following files after {max_retries} attempts:")
         for gz_file in to_retry:
             print(f"\t- {gz_file}")
-
-    # close ftp connection
-    ftp.close()
     
     # display coverage
     coverage = float( (len(all_files) - len(to_retry)) / len(all_files) ) *100.0
     print(f"[*] Extract {coverage} % of baseline articles")
 
 
-def get_pmid_data(pmid_list:list, download_folder:str, max_retries:int, map_file:str, override:bool) -> pl.DataFrame:
+def get_pmid_data(pmid_list:list, download_folder:str, max_retries:int, map_file:str, override:bool, n_download:int=2, n_parse:int=None, stream:bool=False, columns:list=None) -> pl.DataFrame:
     """Get dataframe containing data for specify pmid
     Download only conecrned file from pubmed, use the map file to identify them
 
@@ -167,6 +124,10 @@ def get_pmid_data(pmid_list:list, download_folder:str, max_retries:int, map_file
         - max_retries (int) : number of authorize attempt to dl files
         - map_file (str) : path to the map file
         - override (bool) : if set to False, search for existing parquet file before redownload
+        - n_download (int) : number of parallel downloads
+        - n_parse (int) : number of parsing processes, default to the number of cpu
+        - stream (bool) : if set to True parse files straight from the network, no xml.gz is written to disk
+        - columns (list) : columns to return, default to all columns
 
     Returns:
         - (pl.DataFrame) : data table for specified PMID
@@ -182,102 +143,66 @@ def get_pmid_data(pmid_list:list, download_folder:str, max_retries:int, map_file
     if override and os.path.isdir(download_folder):
         shutil.rmtree(download_folder)
 
-    # look for existing files
-    dl_baseline = [p.split("/")[-1] for p in glob.glob(f"{download_folder}/baseline/*.parquet")]
-    dl_updatefiles = [p.split("/")[-1] for p in glob.glob(f"{download_folder}/updatefiles/*.parquet")]
-
     # init output folder
     if not os.path.isdir(download_folder):
         os.mkdir(download_folder)
         os.mkdir(f"{download_folder}/baseline")
         os.mkdir(f"{download_folder}/updatefiles")
 
-    # get list of files to download
+    # get list of files to download, state of each file is kept in the download folder
     files = get_files_for_pmid(pmid_list, map_file)
-    baseline_files_to_download = []
-    updatefiles_files_to_download = []
-    for tf in files['baseline']:
-        if tf.replace('.xml.gz', '.parquet') not in dl_baseline:
-            baseline_files_to_download.append(tf)
-    for tf in files['updatefiles']:
-        if tf.replace('.xml.gz', '.parquet') not in dl_updatefiles:
-            updatefiles_files_to_download.append(tf)
+    state_file = f"{download_folder}/state.sqlite"
+    sync_state(state_file, baseline_folder, {f: {} for f in files['baseline']}, f"{download_folder}/baseline")
+    sync_state(state_file, updatefiles_folder, {f: {} for f in files['updatefiles']}, f"{download_folder}/updatefiles")
+    baseline_files_to_download = sorted(set(get_work_set(state_file, baseline_folder)) & set(files['baseline']))
+    updatefiles_files_to_download = sorted(set(get_work_set(state_file, updatefiles_folder)) & set(files['updatefiles']))
 
     #----------#
     # BASELINE #
     #----------#
-    # create ftp connection - baseline
-    ftp = get_ftp_connection(ncbi_server_address, baseline_folder)
-
-    # init loop parameter
-    to_retry = baseline_files_to_download
-    attempts = 0
-
-    # collect data
-    while to_retry and attempts < max_retries:
-        failed = []
-        for gz_file in tqdm(to_retry, desc=f"[Attempt {attempts+1}] Extracting Baseline Data"):
-            if download_and_check(gz_file, f"{download_folder}/baseline", ftp):
-                xml_to_parquet(f"{download_folder}/baseline/{gz_file}", f"{download_folder}/baseline/{gz_file.replace('.xml.gz', '.parquet')}", True)
-            else:
-                failed.append(gz_file)
-
-        # update loop parameter
-        to_retry = failed
-        attempts +=1
+    to_retry = run_pipeline(baseline_files_to_download, ncbi_server_address, baseline_folder, f"{download_folder}/baseline", max_retries, n_download, n_parse, desc="Extracting Baseline Data", state_file=state_file, stream=stream)
 
     # display missing files
     if to_retry:
-        print(f"[!][BASELINE]Failed to download the following files after {attempts} attempts:")
+        print(f"[!][BASELINE]Failed to download the following files after {max_retries} attempts:")
         for gz_file in to_retry:
             print(f"\t- {gz_file}")
 
-    # close ftp connection
-    ftp.close()
-
     #-------------#
     # UPDATEFILES #
     #-------------#
-    # create ftp connection - updatefiles
-    ftp = get_ftp_connection(ncbi_server_address, updatefiles_folder)
-
-    # init loop parameter
-    to_retry = updatefiles_files_to_download
-    attempts = 0
-
-    # collect data
-    while to_retry and attempts < max_retries:
-        failed = []
-        for gz_file in tqdm(to_retry, desc=f"[Attempt {attempts+1}] Extracting UpdateFiles Data"):
-            if download_and_check(gz_file, f"{download_folder}/updatefiles", ftp):
-                xml_to_parquet(f"{download_folder}/updatefiles/{gz_file}", f"{download_folder}/updatefiles/{gz_file.replace('.xml.gz', '.parquet')}", True)
-            else:
-                failed.append(gz_file)
-
-        # update loop parameter
-        to_retry = failed
-        attempts +=1
+    to_retry = run_pipeline(updatefiles_files_to_download, ncbi_server_address, updatefiles_folder, f"{download_folder}/updatefiles", max_retries, n_download, n_parse, desc="Extracting UpdateFiles Data", state_file=state_file, stream=stream)
 
     # display missing files
     if to_retry:
-        print(f"[!][UPDATE]Failed to download the following files after {attempts} attempts:")
+        print(f"[!][UPDATE]Failed to download the following files after {max_retries} attempts:")
         for gz_file in to_retry:
             print(f"\t- {gz_file}")
 
-    # close ftp connection
-    ftp.close()
-
-    # assemble dataframe
-    data = []
-    for pqf in glob.glob(f"{download_folder}/baseline/*.parquet"):
-        df = pl.read_parquet(pqf)
-        data.append(df)
-    for pqf in glob.glob(f"{download_folder}/updatefiles/*.parquet"):
-        df = pl.read_parquet(pqf)
-        data.append(df)
-    df = pl.concat(data).filter(pl.col('PMID').is_in(pmid_list))
-
-    return df
+    # assemble dataframe, only the resolved files are scanned and the pmid filter is pushed into the scan
+    parquet_files = [
+        f"{download_folder}/{source}/{gz_file.replace('.xml.gz', '.parquet')}"
+        for source in ['baseline', 'updatefiles']
+        for gz_file in files[source]
+    ]
+    parquet_files = [pqf for pqf in parquet_files if os.path.isfile(pqf)]
+    if not parquet_files:
+        return pl.DataFrame()
+
+    # an article revised in an updatefile also shows up in the baseline file resolved for another pmid,
+    # keep its latest version (files are listed baseline first, then updatefiles in publication order)
+    file_rank = {pqf: rank for rank, pqf in enumerate(parquet_files)}
+    df = (
+        pl.scan_parquet(parquet_files, include_file_paths='SourcePath')
+        .filter(pl.col('PMID').is_in(to_pmid_series(pmid_list).implode()))
+        .sort(pl.col('SourcePath').replace_strict(file_rank, return_dtype=pl.UInt32), maintain_order=True)
+        .unique('PMID', keep='last', maintain_order=True)
+        .drop('SourcePath')
+    )
+    if columns:
+        df = df.select(columns)
+
+    return df.collect()
     
 
 
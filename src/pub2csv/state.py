@@ -0,0 +1,154 @@
+import glob
+import os
+import sqlite3
+from datetime import datetime
+
+
+# status of a remote file
+PENDING = "pending"
+DOWNLOADED = "downloaded"
+DONE = "done"
+FAILED = "failed"
+
+
+def connect_state(db_file:str) -> sqlite3.Connection:
+    """Open the state database, creating its table if needed
+
+    Args:
+        - db_file (str) : path to the sqlite file
+
+    Returns:
+        - (sqlite3.Connection) : connection to the state database
+    
+    """
+
+    connection = sqlite3.connect(db_file, timeout=60)
+    connection.execute(
+        """CREATE TABLE IF NOT EXISTS files (
+            folder TEXT NOT NULL,
+            name TEXT NOT NULL,
+            size INTEGER,
+            modified TEXT,
+            md5 TEXT,
+            downloaded_at TEXT,
+            parquet_path TEXT,
+            row_count INTEGER,
+            status TEXT NOT NULL DEFAULT 'pending',
+            error TEXT,
+            PRIMARY KEY (folder, name)
+        )"""
+    )
+    connection.execute("CREATE INDEX IF NOT EXISTS files_status ON files (folder, status)")
+    return connection
+
+
+def update_file_state(db_file:str, folder:str, name:str, status:str, **fields) -> None:
+    """Insert or update the state of a remote file
+
+    Args:
+        - db_file (str) : path to the sqlite file
+        - folder (str) : ftp folder of the file, e.g /pubmed/baseline/
+        - name (str) : name of the file, e.g pubmed25n0001.xml.gz
+        - status (str) : one of pending, downloaded, done or failed
+        - fields : other columns to set (size, modified, md5, downloaded_at, parquet_path, row_count, error)
+    
+    """
+
+    fields["status"] = status
+    columns = ", ".join(fields)
+    placeholders = ", ".join("?" for _ in fields)
+    updates = ", ".join(f"{c} = excluded.{c}" for c in fields)
+    with connect_state(db_file) as connection:
+        connection.execute(
+            f"INSERT INTO files (folder, name, {columns}) VALUES (?, ?, {placeholders}) "
+            f"ON CONFLICT (folder, name) DO UPDATE SET {updates}",
+            [folder, name, *fields.values()]
+        )
+    connection.close()
+
+
+def sync_state(db_file:str, folder:str, manifest:dict, output_folder:str) -> None:
+    """Register the files listed on the server and reconcile the state with the output folder
+    New files and files whose remote size changed become pending, done files whose
+    parquet disappeared become pending, and parquet files produced before the state
+    database existed are adopted as done
+
+    Args:
+        - db_file (str) : path to the sqlite file
+        - folder (str) : ftp folder of the files, e.g /pubmed/baseline/
+        - manifest (dict) : file name to {"size", "modified"} (both optional), see download.get_remote_manifest
+        - output_folder (str) : folder containing the parquet files
+    
+    """
+
+    with connect_state(db_file) as connection:
+
+        # remote files
+        connection.executemany(
+            "INSERT INTO files (folder, name, size, modified, status) VALUES (?, ?, ?, ?, 'pending') "
+            "ON CONFLICT (folder, name) DO UPDATE SET "
+            "status = CASE WHEN files.size IS NOT excluded.size THEN 'pending' ELSE files.status END, "
+            "size = excluded.size, modified = excluded.modified",
+            [(folder, name, infos.get("size"), str(infos["modified"]) if infos.get("modified") else None) for name, infos in manifest.items()]
+        )
+
+        # local files
+        existing = [os.path.basename(p) for p in glob.glob(f"{output_folder}/*.parquet")]
+        connection.execute("CREATE TEMP TABLE existing (parquet TEXT PRIMARY KEY)")
+        connection.executemany("INSERT INTO existing VALUES (?)", [(p,) for p in existing])
+        connection.execute(
+            "UPDATE files SET status = 'pending' WHERE folder = ? AND status = 'done' "
+            "AND replace(name, '.xml.gz', '.parquet') NOT IN (SELECT parquet FROM existing)",
+            [folder]
+        )
+        connection.execute(
+            "UPDATE files SET status = 'done', parquet_path = ? || '/' || replace(name, '.xml.gz', '.parquet') "
+            "WHERE folder = ? AND status != 'done' AND parquet_path IS NULL "
+            "AND replace(name, '.xml.gz', '.parquet') IN (SELECT parquet FROM existing)",
+            [output_folder, folder]
+        )
+    connection.close()
+
+
+def get_files_by_status(db_file:str, folder:str, status:str, negate:bool=False) -> list:
+    """Return the files of a folder having (or not having) a given status
+
+    Args:
+        - db_file (str) : path to the sqlite file
+        - folder (str) : ftp folder of the files, e.g /pubmed/baseline/
+        - status (str) : one of pending, downloaded, done or failed
+        - negate (bool) : if set to True return files whose status is not status
+
+    Returns:
+        - (list) : sorted file names
+    
+    """
+
+    operator = "!=" if negate else "="
+    with connect_state(db_file) as connection:
+        rows = connection.execute(
+            f"SELECT name FROM files WHERE folder = ? AND status {operator} ? ORDER BY name",
+            [folder, status]
+        ).fetchall()
+    connection.close()
+
+    return [row[0] for row in rows]
+
+
+def get_work_set(db_file:str, folder:str) -> list:
+    """Return the files of a folder that still have to be downloaded and parsed
+
+    Args:
+        - db_file (str) : path to the sqlite file
+        - folder (str) : ftp folder of the files, e.g /pubmed/baseline/
+
+    Returns:
+        - (list) : sorted file names
+    
+    """
+    return get_files_by_status(db_file, folder, DONE, negate=True)
+
+
+def now() -> str:
+    """Current time as stored in the state database"""
+    return datetime.now().isoformat(timespec="seconds")
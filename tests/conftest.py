@@ -0,0 +1,78 @@
+import gzip
+import hashlib
+import os
+import threading
+import types
+
+import pytest
+
+
+def make_pubmed_xml(pmids:list) -> bytes:
+    """Minimal pubmed xml file holding one article per pmid"""
+    articles = "".join(
+        f"""<PubmedArticle><MedlineCitation>
+        <PMID Version="1">{pmid}</PMID>
+        <DateRevised><Year>2024</Year><Month>05</Month><Day>02</Day></DateRevised>
+        <Article>
+          <Journal><JournalIssue><PubDate><Year>2023</Year><Month>Sep</Month><Day>{i % 28 + 1}</Day></PubDate></JournalIssue><Title>Journal {i % 3}</Title></Journal>
+          <ArticleTitle>Article {pmid} about cancer</ArticleTitle>
+          <Abstract><AbstractText>Abstract of article {pmid}.</AbstractText></Abstract>
+          <AuthorList><Author><LastName>Doe</LastName><ForeName>Jane</ForeName></Author></AuthorList>
+        </Article>
+        <KeywordList><Keyword>kw{i}</Keyword></KeywordList>
+        </MedlineCitation></PubmedArticle>"""
+        for i, pmid in enumerate(pmids)
+    )
+    return f'<?xml version="1.0" encoding="utf-8"?><PubmedArticleSet>{articles}</PubmedArticleSet>'.encode()
+
+
+def write_pubmed_file(folder, gz_file:str, pmids:list, md5:str=None) -> bytes:
+    """Write gz_file and its md5 file (md5 defaults to the real hash), return the gz content"""
+    content = gzip.compress(make_pubmed_xml(pmids), mtime=0)
+    with open(os.path.join(folder, gz_file), "wb") as f:
+        f.write(content)
+    with open(os.path.join(folder, f"{gz_file}.md5"), "w") as f:
+        f.write(f"MD5({gz_file})= {md5 or hashlib.md5(content).hexdigest()}\n")
+    return content
+
+
+@pytest.fixture
+def ftp_server(tmp_path):
+    """Local anonymous ftp server standing in for ncbi, serving tmp_path/remote
+    The first RETR of each file listed in handler.failures is answered with an error,
+    handler.connections and handler.retrieved record the sessions and transfers"""
+    pytest.importorskip("pyftpdlib")
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import FTPServer
+
+    class FlakyHandler(FTPHandler):
+        failures = set()
+        connections = 0
+        retrieved = []
+
+        def on_connect(self):
+            type(self).connections += 1
+
+        def ftp_RETR(self, file):
+            name = os.path.basename(file)
+            if name in self.failures:
+                self.failures.discard(name)
+                self.respond("451 Transfer aborted.")
+                return
+            self.retrieved.append((name, self._restart_position))
+            return super().ftp_RETR(file)
+
+    root = tmp_path / "remote"
+    (root / "pubmed" / "baseline").mkdir(parents=True)
+    (root / "pubmed" / "updatefiles").mkdir(parents=True)
+    authorizer = DummyAuthorizer()
+    authorizer.add_anonymous(str(root))
+    FlakyHandler.authorizer = authorizer
+
+    server = FTPServer(("127.0.0.1", 0), FlakyHandler)
+    thread = threading.Thread(target=server.serve_forever, kwargs={"timeout": 0.1, "handle_exit": False}, daemon=True)
+    thread.start()
+    yield types.SimpleNamespace(port=server.address[1], root=root, handler=FlakyHandler)
+    server.close_all()
+    thread.join(timeout=5)
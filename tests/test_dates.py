@@ -0,0 +1,125 @@
+import datetime as dt
+import re
+
+import polars as pl
+import pytest
+
+from pub2csv.parser import normalize_pubdate, normalize_date_expr, clean_df
+
+
+def normalize_pubdate_split(date_str:str) -> str | None:
+    """Copy of the original split based normalize_pubdate, the reference of normalize_date_expr"""
+    if not date_str:
+        return None
+
+    # params
+    month_map = {
+        "jan": "01",
+        "feb": "02",
+        "mar": "03",
+        "apr": "04",
+        "may": "05",
+        "jun": "06",
+        "jul": "07",
+        "aug": "08",
+        "sep": "09",
+        "sept": "09",
+        "oct": "10",
+        "nov": "11",
+        "dec": "12"
+    }
+
+    # capture année, mois, jour éventuel
+    parts = re.split(r"[- ]", date_str.strip())
+    if len(parts) == 1:
+        # cas: juste l'année
+        year = parts[0]
+        return f"{year}-01-01"
+    elif len(parts) == 2:
+        # cas: année + mois
+        year, month = parts
+        month_num = month_map.get(month.lower(), "01")
+        return f"{year}-{month_num}-01"
+    elif len(parts) >= 3:
+        # cas: année + mois + jour
+        year, month, day = parts[:3]
+        month_num = month_map.get(month.lower(), "01")
+        # pad le jour à 2 chiffres
+        day = day.zfill(2)
+        return f"{year}-{month_num}-{day}"
+    return None
+
+
+# dates the original function handles correctly, both versions must agree
+ORIGINAL_CORRECT = [
+    "2025-Sep-14",
+    "2025-sept-14",
+    "2025-SEP-1",
+    "2024 Jan 5",
+    "2020-Feb-29",
+    "2019 Spring",
+    "2018 Fall",
+    "2018",
+    "2018-Feb",
+    "  2017-Mar-02  ",
+    "1998 Dec 21-28",
+    "2020-Jan-32",
+    "2021-Feb-29",
+    "2018Feb",
+    "20181",
+    "not a date",
+    "",
+    None,
+]
+
+# intentional differences : raw date, original result, new result
+NUMERIC_MONTHS = [
+    ("2023-09-14", "2023-01-14", "2023-09-14"),
+    ("2023-9-4", "2023-01-04", "2023-09-04"),
+    ("2020-02-30", "2020-01-30", None),
+    ("2020-13-01", "2020-01-01", None),
+    ("2020-0-01", "2020-01-01", None),
+]
+MEDLINE_DATES = [
+    ("2019 Nov-Dec", None, "2019-11-01"),
+    ("2000 Spring-Summer", None, "2000-01-01"),
+    ("1998 Dec-1999 Jan", None, "1998-12-01"),
+    ("2019 Nov-Dec 2020", None, "2019-11-01"),
+]
+# stray characters after a valid year / month are ignored instead of voiding the date
+LENIENT = [
+    ("2021-Jan-5x", None, "2021-01-01"),
+    ("2018--Feb", None, "2018-02-01"),
+]
+
+
+def to_date(date_str:str | None) -> dt.date | None:
+    return pl.Series([date_str], dtype=pl.Utf8).str.strptime(pl.Date, "%Y-%m-%d", strict=False)[0]
+
+
+def normalize(raw_dates:list) -> list:
+    df = pl.DataFrame({"PublicationDate": raw_dates}, schema={"PublicationDate": pl.Utf8})
+    return df.select(normalize_date_expr("PublicationDate")).to_series().to_list()
+
+
+def test_expr_matches_original():
+    expected = [to_date(normalize_pubdate_split(d)) for d in ORIGINAL_CORRECT]
+    assert normalize(ORIGINAL_CORRECT) == expected
+
+
+@pytest.mark.parametrize("raw, original, new", NUMERIC_MONTHS + MEDLINE_DATES + LENIENT)
+def test_intentional_differences(raw, original, new):
+    assert to_date(normalize_pubdate_split(raw)) == to_date(original)
+    assert normalize([raw]) == [to_date(new)]
+
+
+def test_rowwise_matches_expr():
+    raw_dates = ORIGINAL_CORRECT + [raw for raw, _, _ in NUMERIC_MONTHS + MEDLINE_DATES + LENIENT]
+    assert normalize(raw_dates) == [to_date(normalize_pubdate(d)) for d in raw_dates]
+
+
+def test_clean_df_dates():
+    df = clean_df(pl.DataFrame({"PublicationDate": ["2019 Nov-Dec"], "RevisionDate": ["2024-05-02"]}))
+    assert df.schema["PublicationDate"] == pl.Date
+    assert str(df["PublicationDate"][0]) == "2019-11-01"
+    assert str(df["RevisionDate"][0]) == "2024-05-02"
@@ -0,0 +1,131 @@
+import ftplib
+import hashlib
+import os
+
+import pytest
+
+from pub2csv.download import download_files_parallel, get_ftp_connection, retrieve_file, download_pubmed_file, commit_download
+
+
+FILES = {f"pubmed25n{i:04d}.xml.gz": os.urandom(200_000 + i) for i in range(1, 5)}
+
+
+@pytest.fixture
+def remote_files(ftp_server):
+    for name, content in FILES.items():
+        (ftp_server.root / "pubmed" / "baseline" / name).write_bytes(content)
+    return ftp_server
+
+
+def test_parallel_download_reconnects(remote_files, tmp_path):
+    remote_files.handler.failures = {"pubmed25n0002.xml.gz"}
+    download_folder = str(tmp_path / "download")
+    report = download_files_parallel(list(FILES), "127.0.0.1", "/pubmed/baseline/", download_folder, n_connections=2, max_retries=3, port=remote_files.port)
+
+    # every file made it, including the one whose first transfer failed
+    assert sorted(report["downloaded"]) == sorted(FILES)
+    assert report["failed"] == []
+    for name, content in FILES.items():
+        with open(f"{download_folder}/{name}", "rb") as f:
+            assert f.read() == content
+    assert not [f for f in os.listdir(download_folder) if f.endswith(".part")]
+
+    # the failed transfer was retried on a fresh connection
+    assert remote_files.handler.connections >= 3
+
+    # throughput report
+    assert report["bytes"] == sum(len(content) for content in FILES.values())
+    assert report["seconds"] > 0
+    assert report["throughput"] == pytest.approx(report["bytes"] / (1024 ** 2) / report["seconds"])
+
+
+def test_missing_file_leaves_no_part(remote_files, tmp_path):
+    download_folder = str(tmp_path / "download")
+    report = download_files_parallel(["nope.xml.gz"], "127.0.0.1", "/pubmed/baseline/", download_folder, max_retries=2, port=remote_files.port)
+
+    assert report["downloaded"] == []
+    assert report["failed"] == ["nope.xml.gz"]
+    assert os.listdir(download_folder) == []
+
+
+@pytest.mark.parametrize("block_size", [1000, 64 * 1024, 4 * 1024 * 1024])
+def test_block_size(remote_files, tmp_path, monkeypatch, block_size):
+    # record the block size requested for each transfer and the size of the received blocks
+    requested, received = [], []
+    retrbinary = ftplib.FTP.retrbinary
+
+    def spy(self, cmd, callback, blocksize=8192, rest=None):
+        requested.append(blocksize)
+        def record(chunk):
+            received.append(len(chunk))
+            callback(chunk)
+        return retrbinary(self, cmd, record, blocksize, rest)
+
+    monkeypatch.setattr(ftplib.FTP, "retrbinary", spy)
+    download_folder = str(tmp_path / "download")
+    report = download_files_parallel(list(FILES), "127.0.0.1", "/pubmed/baseline/", download_folder, n_connections=2, block_size=block_size, port=remote_files.port)
+
+    assert sorted(report["downloaded"]) == sorted(FILES)
+    for name, content in FILES.items():
+        with open(f"{download_folder}/{name}", "rb") as f:
+            assert f.read() == content
+    assert set(requested) == {block_size}
+    assert max(received) <= block_size
+
+
+@pytest.mark.parametrize("offset", [1, 65_536, 123_457])
+def test_resume_from_part_file(remote_files, tmp_path, offset):
+    name = "pubmed25n0001.xml.gz"
+    content = FILES[name]
+    part_file = tmp_path / f"{name}.part"
+    part_file.write_bytes(content[:offset])
+
+    ftp = get_ftp_connection("127.0.0.1", "/pubmed/baseline/", remote_files.port)
+    hasher = hashlib.md5()
+    retrieve_file(ftp, name, str(part_file), block_size=8192, hasher=hasher)
+    ftp.close()
+
+    # only the missing bytes were requested, the hash covers the whole file
+    assert remote_files.handler.retrieved == [(name, offset)]
+    assert part_file.read_bytes() == content
+    assert hasher.hexdigest() == hashlib.md5(content).hexdigest()
+
+
+def test_resume_edge_cases(remote_files, tmp_path):
+    name = "pubmed25n0002.xml.gz"
+    content = FILES[name]
+    ftp = get_ftp_connection("127.0.0.1", "/pubmed/baseline/", remote_files.port)
+
+    # complete part file, nothing to transfer
+    part_file = tmp_path / f"{name}.part"
+    part_file.write_bytes(content)
+    hasher = hashlib.md5()
+    retrieve_file(ftp, name, str(part_file), hasher=hasher)
+    assert remote_files.handler.retrieved == []
+    assert hasher.hexdigest() == hashlib.md5(content).hexdigest()
+
+    # part file larger than the remote file, restart from scratch
+    part_file.write_bytes(content + b"garbage")
+    hasher = hashlib.md5()
+    retrieve_file(ftp, name, str(part_file), hasher=hasher)
+    ftp.close()
+    assert remote_files.handler.retrieved == [(name, 0)]
+    assert part_file.read_bytes() == content
+    assert hasher.hexdigest() == hashlib.md5(content).hexdigest()
+
+
+def test_download_pubmed_file_resumes(remote_files, tmp_path):
+    name = "pubmed25n0003.xml.gz"
+    content = FILES[name]
+    remote = remote_files.root / "pubmed" / "baseline"
+    (remote / f"{name}.md5").write_text(f"MD5({name})= {hashlib.md5(content).hexdigest()}\n")
+    (tmp_path / f"{name}.part").write_bytes(content[:1000])
+
+    ftp = get_ftp_connection("127.0.0.1", "/pubmed/baseline/", remote_files.port)
+    hash_computed = download_pubmed_file(name, str(tmp_path), ftp)
+    ftp.close()
+
+    assert (name, 1000) in remote_files.handler.retrieved
+    assert commit_download(name, str(tmp_path), hash_computed)
+    assert (tmp_path / name).read_bytes() == content
+    assert not (tmp_path / f"{name}.part").exists()
@@ -0,0 +1,107 @@
+import datetime as dt
+
+import polars as pl
+import pytest
+
+import pub2csv.filter
+from pub2csv.filter import filter_keyword, query_corpus
+from pub2csv.mapper import extract_map, write_compact_map
+
+
+@pytest.fixture
+def articles():
+    return pl.DataFrame({
+        "PMID": ["1", "2", "3"],
+        "Title": ["Cancer genes", "Heart disease", None],
+        "Abstract": ["About oncogenes.", "Nothing to see.", "Gene therapy"],
+        "Keywords": ["tumor; cancer", "cardiology", None],
+    })
+
+
+def test_multi_term(articles):
+    df = filter_keyword(articles, ["cancer", "therapy"], return_matches=True)
+    assert df["PMID"].to_list() == ["1", "3"]
+    assert df["MatchedTerms"].to_list() == [["cancer"], ["therapy"]]
+
+
+def test_multi_term_options(articles):
+    assert filter_keyword(articles, ["GENE"], ignore_case=True)["PMID"].to_list() == ["1", "3"]
+    df = filter_keyword(articles, ["GENE"], ignore_case=True, whole_word=True, return_matches=True)
+    assert df["PMID"].to_list() == ["3"]
+    assert df["MatchedTerms"].to_list() == [["GENE"]]
+
+
+def test_single_regex(articles):
+    assert filter_keyword(articles, "^Heart")["PMID"].to_list() == ["2"]
+
+
+@pytest.mark.parametrize("terms", [[], [""], ["", ""]])
+@pytest.mark.parametrize("whole_word", [False, True])
+def test_empty_terms(articles, terms, whole_word):
+    with pytest.raises(ValueError):
+        filter_keyword(articles, terms, whole_word=whole_word)
+    with pytest.raises(ValueError):
+        filter_keyword(articles.head(0), terms, whole_word=whole_word, return_matches=True)
+
+
+def test_empty_term_ignored(articles):
+    assert filter_keyword(articles, ["", "cardiology"])["PMID"].to_list() == ["2"]
+    assert filter_keyword(articles, ["", "cardiology"], whole_word=True)["PMID"].to_list() == ["2"]
+
+
+def write_corpus_file(path, pmids, start, journal="Journal"):
+    pl.DataFrame({
+        "PMID": [str(pmid) for pmid in pmids],
+        "Title": [f"Article {pmid}" for pmid in pmids],
+        "Abstract": ["Cancer" if pmid % 2 else "Heart" for pmid in pmids],
+        "Keywords": pl.Series([None] * len(pmids), dtype=pl.Utf8),
+        "MeSHTerms": ["Humans"] * len(pmids),
+        "Journal": [journal] * len(pmids),
+        "PublicationDate": pl.date_range(start, start + dt.timedelta(days=len(pmids) - 1), eager=True),
+    }).write_parquet(path)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    baseline, updatefiles = tmp_path / "baseline", tmp_path / "updatefiles"
+    baseline.mkdir()
+    updatefiles.mkdir()
+
+    # the same 100 articles in a baseline file and an updatefile, revised ones are shifted by 50 days
+    write_corpus_file(baseline / "pubmed25n0001.parquet", range(100), dt.date(2020, 1, 1))
+    write_corpus_file(updatefiles / "pubmed25n1300.parquet", range(100), dt.date(2020, 2, 20), "Revised")
+    write_corpus_file(baseline / "pubmed25n0002.parquet", range(100, 150), dt.date(2010, 1, 1))
+
+    map_file = str(tmp_path / "map.parquet")
+    extract_map(str(baseline), str(updatefiles), map_file)
+    write_compact_map(map_file, str(tmp_path / "map.arrow"))
+
+    # file produced after the map was built
+    write_corpus_file(updatefiles / "pubmed25n1301.parquet", range(150, 160), dt.date(2020, 3, 1))
+
+    return [str(baseline), str(updatefiles)], map_file, str(tmp_path / "map.arrow")
+
+
+@pytest.mark.parametrize("window", [("01/01/2020", None), ("15/02/2020", "10/03/2020"), (None, "31/12/2010"), ("01/01/2021", None)])
+def test_query_pruning_keeps_results(corpus, monkeypatch, window):
+    folders, map_file, compact_file = corpus
+    date_min, date_max = window
+
+    scanned = []
+    scan_corpus = pub2csv.filter.scan_corpus
+    monkeypatch.setattr(pub2csv.filter, "scan_corpus", lambda folders, files=None: scanned.append(files) or scan_corpus(folders, files))
+
+    expected = query_corpus(folders, date_min, date_max, keywords=["Cancer"]).collect()
+    for mapped in (map_file, compact_file):
+        assert query_corpus(folders, date_min, date_max, keywords=["Cancer"], map_file=mapped).collect().equals(expected)
+
+    # files outside the window are not scanned, the file missing from the map is
+    if date_min == "01/01/2020":
+        assert scanned[-1] == ["pubmed25n0001.xml.gz", "pubmed25n1300.xml.gz", "pubmed25n1301.xml.gz"]
+
+
+def test_query_returns_every_version(corpus):
+    folders, map_file, _ = corpus
+    df = query_corpus(folders, "01/01/2020", None, map_file=map_file).collect()
+    assert df.height == 210
+    assert df.filter(pl.col("PMID") == "0")["Journal"].to_list() == ["Journal", "Revised"]
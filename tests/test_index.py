@@ -0,0 +1,79 @@
+import os
+
+import polars as pl
+import pytest
+
+from pub2csv.index import update_index, search_index, compact_index
+
+
+def write_articles(path, rows, list_columns=False):
+    df = pl.DataFrame(rows, schema={"PMID": pl.Utf8, "Title": pl.Utf8, "Abstract": pl.Utf8, "Keywords": pl.Utf8}, orient="row")
+    if list_columns:
+        df = df.with_columns(pl.col("Keywords").str.split("; "))
+    df.write_parquet(path)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    baseline = tmp_path / "baseline"
+    updatefiles = tmp_path / "updatefiles"
+    baseline.mkdir()
+    updatefiles.mkdir()
+    write_articles(baseline / "pubmed25n0001.parquet", [
+        ("1", "Breast cancer risk", "Genes and risk factors.", "kw one; kw two"),
+        ("2", "Heart disease", "Cancer is not discussed.", None),
+    ])
+    write_articles(baseline / "pubmed25n0002.parquet", [
+        ("3", "Gene expression", "Breast tissue cancer.", "oncology"),
+    ], list_columns=True)
+    return [str(baseline), str(updatefiles)]
+
+
+def search(index_folder, query, mode="and"):
+    return search_index(index_folder, query, mode).to_list()
+
+
+def test_queries(corpus, tmp_path):
+    index_folder = str(tmp_path / "index")
+    update_index(corpus, index_folder)
+
+    assert search(index_folder, ["cancer"]) == [1, 2, 3]
+    assert search(index_folder, ["cancer", "gene"]) == [3]
+    assert search(index_folder, ["heart", "oncology"], "or") == [2, 3]
+    assert search(index_folder, ["breast cancer"]) == [1]
+    assert search(index_folder, ["nothing"]) == []
+
+
+def test_no_bigram_across_keywords(corpus, tmp_path):
+    index_folder = str(tmp_path / "index")
+    update_index(corpus, index_folder)
+
+    assert search(index_folder, ["kw one"]) == [1]
+    assert search(index_folder, ["one kw"]) == []
+
+
+def test_update_supersedes_and_compacts(corpus, tmp_path):
+    index_folder = str(tmp_path / "index")
+    update_index(corpus, index_folder)
+
+    # revised version of article 2 in an updatefile
+    write_articles(os.path.join(corpus[1], "pubmed25n1300.parquet"), [
+        ("2", "Heart failure", "A new abstract.", None),
+    ])
+    report = update_index(corpus, index_folder, max_segments=2)
+    assert report == {"added": ["pubmed25n1300.xml.gz"], "compacted": True}
+    assert sorted(os.listdir(f"{index_folder}/postings")) == ["main.parquet"]
+
+    assert search(index_folder, ["cancer"]) == [1, 3]
+    assert search(index_folder, ["heart failure"]) == [2]
+
+    # compacting again keeps the index intact
+    compact_index(index_folder)
+    assert search(index_folder, ["cancer"]) == [1, 3]
+
+
+def test_unknown_mode(corpus, tmp_path):
+    index_folder = str(tmp_path / "index")
+    update_index(corpus, index_folder)
+    with pytest.raises(ValueError):
+        search_index(index_folder, ["cancer"], "xor")
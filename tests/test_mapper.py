@@ -0,0 +1,211 @@
+import datetime as dt
+import os
+import shutil
+
+import polars as pl
+import pytest
+
+from pub2csv.mapper import (
+    extract_map,
+    update_map,
+    remove_from_map,
+    scan_map,
+    load_sources,
+    get_map_files,
+    write_compact_map,
+    load_compact_map,
+    get_files_for_pmid,
+    get_files_between_date,
+    PubmedIndex,
+    COMPACT_SCHEMA,
+)
+
+
+def write_source_file(folder, name, pmids, start=dt.date(2020, 1, 1)):
+    """Parquet file of the corpus, article i is published i days after start"""
+    pl.DataFrame({
+        "PMID": [str(pmid) for pmid in pmids],
+        "PublicationDate": [start + dt.timedelta(days=i) for i in range(len(pmids))],
+    }, schema={"PMID": pl.Utf8, "PublicationDate": pl.Date}).write_parquet(os.path.join(folder, name))
+
+
+@pytest.fixture
+def folders(tmp_path):
+    baseline, updatefiles = tmp_path / "baseline", tmp_path / "updatefiles"
+    baseline.mkdir()
+    updatefiles.mkdir()
+    write_source_file(baseline, "pubmed25n0001.parquet", range(1, 11))
+    write_source_file(baseline, "pubmed25n0002.parquet", range(11, 21), dt.date(2021, 1, 1))
+    write_source_file(updatefiles, "pubmed25n1300.parquet", [5, 12, 30])
+    return str(baseline), str(updatefiles)
+
+
+def test_compact_map_follows_update_map(folders, tmp_path):
+    baseline, updatefiles = folders
+    map_file, compact_file = str(tmp_path / "map.parquet"), str(tmp_path / "map.arrow")
+    extract_map(baseline, updatefiles, map_file)
+    write_compact_map(map_file, compact_file)
+    assert get_files_for_pmid(["7", "40"], compact_file) == {"baseline": ["pubmed25n0001.xml.gz"], "updatefiles": []}
+
+    # daily update revising pmid 7 and adding pmid 40
+    write_source_file(updatefiles, "pubmed25n1301.parquet", [7, 40])
+    update_map(baseline, updatefiles, map_file)
+    assert get_files_for_pmid(["7", "40"], compact_file) == get_files_for_pmid(["7", "40"], map_file) == {"baseline": [], "updatefiles": ["pubmed25n1301.xml.gz"]}
+
+    # reprocessed file no longer holding pmid 7
+    write_source_file(updatefiles, "pubmed25n1301.parquet", [40])
+    update_map(baseline, updatefiles, map_file, reprocessed=["pubmed25n1301.xml.gz"])
+    assert get_files_for_pmid(["7"], compact_file) == {"baseline": ["pubmed25n0001.xml.gz"], "updatefiles": []}
+
+
+def test_compact_map_without_source(folders, tmp_path):
+    baseline, updatefiles = folders
+    map_file, compact_file = str(tmp_path / "map.parquet"), str(tmp_path / "compact" / "map.arrow")
+    extract_map(baseline, updatefiles, map_file)
+    os.mkdir(tmp_path / "compact")
+    write_compact_map(map_file, compact_file)
+
+    # a compact map shipped without its map file is used as is
+    shutil.rmtree(tmp_path / "baseline")
+    os.remove(map_file)
+    assert get_files_for_pmid(["12"], compact_file) == {"baseline": [], "updatefiles": ["pubmed25n1300.xml.gz"]}
+
+
+def read_map(map_file):
+    """Entries and indexed files of a map, in a canonical order"""
+    entries = scan_map(map_file).collect().sort(pl.all())
+    sources = load_sources(map_file).select("SourceFile", "Source").sort("SourceFile")
+    return entries, sources
+
+
+def assert_same_map(map_file, folders, tmp_path):
+    reference = str(tmp_path / "reference.parquet")
+    extract_map(*folders, reference)
+    for table, expected in zip(read_map(map_file), read_map(reference)):
+        assert table.equals(expected)
+
+
+def test_update_map_matches_extract_map(folders, tmp_path):
+    baseline, updatefiles = folders
+    map_file = str(tmp_path / "map.parquet")
+
+    # first run builds the whole map
+    report = update_map(baseline, updatefiles, map_file)
+    assert report == {"added": ["pubmed25n0001.xml.gz", "pubmed25n0002.xml.gz", "pubmed25n1300.xml.gz"], "removed": [], "compacted": False}
+    assert_same_map(map_file, folders, tmp_path)
+
+    # append new files in segments
+    write_source_file(updatefiles, "pubmed25n1301.parquet", [3, 41])
+    assert update_map(baseline, updatefiles, map_file)["added"] == ["pubmed25n1301.xml.gz"]
+    write_source_file(updatefiles, "pubmed25n1302.parquet", [42, 43])
+    assert update_map(baseline, updatefiles, map_file)["added"] == ["pubmed25n1302.xml.gz"]
+    assert len(get_map_files(map_file)) == 3
+    assert_same_map(map_file, folders, tmp_path)
+
+    # nothing new
+    assert update_map(baseline, updatefiles, map_file) == {"added": [], "removed": [], "compacted": False}
+
+    # reprocess a file of the main map and the only file of a segment
+    write_source_file(baseline, "pubmed25n0002.parquet", range(11, 16), dt.date(2022, 6, 1))
+    write_source_file(updatefiles, "pubmed25n1301.parquet", [41])
+    report = update_map(baseline, updatefiles, map_file, reprocessed=["pubmed25n0002.xml.gz", "pubmed25n1301.xml.gz"])
+    assert report == {"added": ["pubmed25n0002.xml.gz", "pubmed25n1301.xml.gz"], "removed": ["pubmed25n0002.xml.gz", "pubmed25n1301.xml.gz"], "compacted": False}
+    assert_same_map(map_file, folders, tmp_path)
+
+    # merge segments once there are too many
+    write_source_file(updatefiles, "pubmed25n1303.parquet", [44])
+    report = update_map(baseline, updatefiles, map_file, max_segments=2)
+    assert report["compacted"]
+    assert get_map_files(map_file) == [map_file]
+    assert load_sources(map_file)["Segment"].to_list() == [""] * 6
+    assert_same_map(map_file, folders, tmp_path)
+
+    # the compacted map stays sorted by date
+    dates = pl.read_parquet(map_file)["PublicationDate"]
+    assert dates.is_sorted()
+
+
+def test_remove_from_map(folders, tmp_path):
+    baseline, updatefiles = folders
+    map_file = str(tmp_path / "map.parquet")
+    extract_map(baseline, updatefiles, map_file)
+    write_source_file(updatefiles, "pubmed25n1301.parquet", [41])
+    update_map(baseline, updatefiles, map_file)
+
+    assert remove_from_map(map_file, ["pubmed25n1301.xml.gz", "pubmed25n0001.xml.gz", "unknown.xml.gz"]) == ["pubmed25n0001.xml.gz", "pubmed25n1301.xml.gz"]
+    assert get_map_files(map_file) == [map_file]
+    entries, sources = read_map(map_file)
+    assert sources["SourceFile"].to_list() == ["pubmed25n0002.xml.gz", "pubmed25n1300.xml.gz"]
+    assert sorted(entries["PMID"].to_list(), key=int) == [str(pmid) for pmid in [5, 11, 12, 12, 13, 14, 15, 16, 17, 18, 19, 20, 30]]
+    assert remove_from_map(map_file, ["pubmed25n0001.xml.gz"]) == []
+
+
+@pytest.fixture
+def maps(folders, tmp_path):
+    map_file, compact_file = str(tmp_path / "map.parquet"), str(tmp_path / "map.arrow")
+    extract_map(*folders, map_file)
+    write_compact_map(map_file, compact_file)
+    return map_file, compact_file
+
+
+@pytest.mark.parametrize("pmids", [
+    ["1"],
+    ["5"],
+    ["5", "12", "30"],
+    ["1", "5", "11", "20", "30"],
+    ["999", "not a pmid"],
+    [],
+    pl.Series(["12", "12", "3"]),
+])
+def test_compact_pmid_lookup(maps, pmids):
+    map_file, compact_file = maps
+    assert get_files_for_pmid(pmids, compact_file) == get_files_for_pmid(pmids, map_file)
+
+
+def test_compact_lookup_prefers_updatefiles(maps):
+    _, compact_file = maps
+    # 5 and 12 are in baseline files and in the updatefile, 1 only in a baseline file
+    assert get_files_for_pmid(["5", "12"], compact_file) == {"baseline": [], "updatefiles": ["pubmed25n1300.xml.gz"]}
+    assert get_files_for_pmid(["1", "12"], compact_file) == {"baseline": ["pubmed25n0001.xml.gz"], "updatefiles": ["pubmed25n1300.xml.gz"]}
+
+
+@pytest.mark.parametrize("window", [("2020-01-01", "2020-01-02"), ("2020-01-01", "2020-12-31"), ("2021-01-01", "2021-01-05"), ("2019-01-01", "2019-12-31")])
+@pytest.mark.parametrize("latest", [True, False])
+def test_compact_date_lookup(maps, window, latest):
+    map_file, compact_file = maps
+    assert get_files_between_date(*window, compact_file, latest) == get_files_between_date(*window, map_file, latest)
+
+
+def test_compact_encoding(maps):
+    map_file, compact_file = maps
+    entries, files = load_compact_map(compact_file)
+    assert entries.schema == pl.Schema(COMPACT_SCHEMA)
+    assert entries["PMID"].is_sorted()
+    assert entries.height == pl.scan_parquet(map_file).select(pl.len()).collect().item()
+    assert files["SourceFile"].to_list() == ["pubmed25n0001.xml.gz", "pubmed25n0002.xml.gz", "pubmed25n1300.xml.gz"]
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_index_reloads_after_update_map(folders, maps, compact):
+    baseline, updatefiles = folders
+    map_file, compact_file = maps
+    index = PubmedIndex(compact_file if compact else map_file, cache_size=8)
+
+    assert index.get_files_for_pmid(["7", "40"]) == {"baseline": ["pubmed25n0001.xml.gz"], "updatefiles": []}
+    assert index.get_files_for_pmid(["40", "7", "7"]) == {"baseline": ["pubmed25n0001.xml.gz"], "updatefiles": []}
+    assert index.lookup_pmid.cache_info().hits == 1
+    assert index.get_files_between_date("2020-01-01", "2020-01-02") == {"baseline": ["pubmed25n0001.xml.gz"], "updatefiles": ["pubmed25n1300.xml.gz"]}
+    assert not index.reload_if_changed()
+
+    # daily update revising pmid 7 and adding pmid 40
+    write_source_file(updatefiles, "pubmed25n1301.parquet", [7, 40], dt.date(2019, 1, 1))
+    update_map(baseline, updatefiles, map_file)
+    assert index.get_files_for_pmid(["7", "40"]) == {"baseline": [], "updatefiles": ["pubmed25n1301.xml.gz"]}
+    assert index.lookup_pmid.cache_info().hits == 0
+    assert index.get_files_between_date("2019-01-01", "2019-01-01") == {"baseline": [], "updatefiles": ["pubmed25n1301.xml.gz"]}
+    assert not index.reload_if_changed()
+
+    # compaction rewrites the map files
+    update_map(baseline, updatefiles, map_file, reprocessed=["pubmed25n1301.xml.gz"], max_segments=0)
+    assert index.reload_if_changed()
+    assert index.get_files_for_pmid(["7", "40"]) == {"baseline": [], "updatefiles": ["pubmed25n1301.xml.gz"]}
@@ -0,0 +1,128 @@
+import gzip
+
+import pytest
+
+from pub2csv import parser
+
+from .conftest import make_pubmed_xml
+
+
+SAMPLE = b"""<?xml version="1.0" encoding="utf-8"?>
+<PubmedArticleSet>
+  <PubmedArticle>
+    <MedlineCitation>
+      <PMID Version="1">1001</PMID>
+      <DateRevised><Year>2024</Year><Month>05</Month><Day>02</Day></DateRevised>
+      <Article>
+        <Journal>
+          <JournalIssue><PubDate><Year>2023</Year><Month>Sep</Month><Day>14</Day></PubDate></JournalIssue>
+          <Title>Journal of Tests</Title>
+        </Journal>
+        <ArticleTitle>Cancer and genes</ArticleTitle>
+        <Abstract>
+          <AbstractText Label="BACKGROUND">First part.</AbstractText>
+          <AbstractText Label="RESULTS">Second part.</AbstractText>
+        </Abstract>
+        <AuthorList>
+          <Author><LastName>Doe</LastName><ForeName>Jane</ForeName></Author>
+          <Author><LastName>Roe</LastName><Initials>R</Initials></Author>
+        </AuthorList>
+      </Article>
+      <MeshHeadingList>
+        <MeshHeading><DescriptorName UI="D006801">Humans</DescriptorName></MeshHeading>
+        <MeshHeading><DescriptorName UI="D009369">Neoplasms</DescriptorName></MeshHeading>
+      </MeshHeadingList>
+      <KeywordList><Keyword>cancer</Keyword><Keyword>gene expression</Keyword></KeywordList>
+    </MedlineCitation>
+    <PubmedData>
+      <ReferenceList><Reference><ArticleIdList><ArticleId IdType="pubmed">42</ArticleId></ArticleIdList></Reference></ReferenceList>
+    </PubmedData>
+  </PubmedArticle>
+  <PubmedArticle>
+    <MedlineCitation>
+      <PMID Version="1">1002</PMID>
+      <Article>
+        <Journal>
+          <JournalIssue><PubDate><MedlineDate>2019 Nov-Dec</MedlineDate></PubDate></JournalIssue>
+          <Title>Another Journal</Title>
+        </Journal>
+        <ArticleTitle>No abstract here</ArticleTitle>
+      </Article>
+    </MedlineCitation>
+  </PubmedArticle>
+</PubmedArticleSet>
+"""
+
+
+@pytest.fixture
+def sample_file(tmp_path):
+    path = tmp_path / "pubmed_sample.xml.gz"
+    with gzip.open(path, "wb") as f:
+        f.write(SAMPLE)
+    return str(path)
+
+
+@pytest.mark.parametrize("list_columns", [False, True])
+@pytest.mark.parametrize("streaming", [True, False])
+def test_backend_parity(sample_file, list_columns, streaming):
+    pytest.importorskip("lxml")
+    df_etree = parser.xml_to_df(sample_file, streaming=streaming, list_columns=list_columns, backend="etree")
+    df_lxml = parser.xml_to_df(sample_file, streaming=streaming, list_columns=list_columns, backend="lxml")
+    assert df_etree.height == 2
+    assert df_etree.equals(df_lxml)
+
+
+def test_etree_fields(sample_file):
+    df = parser.xml_to_df(sample_file, list_columns=True, backend="etree")
+    first = df.row(0, named=True)
+    assert first["PMID"] == "1001"
+    assert first["Abstract"] == "First part. Second part."
+    assert first["PublicationDate"] == "2023-Sep-14"
+    assert first["Authors"] == ["Jane Doe", "Roe"]
+    assert first["MeSHTerms"] == ["Humans", "Neoplasms"]
+    assert df.row(1, named=True)["PublicationDate"] == "2019 Nov-Dec"
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        parser.get_backend("unknown")
+
+
+def test_lxml_syntax_error_is_picklable(tmp_path):
+    pytest.importorskip("lxml")
+    import pickle
+
+    path = tmp_path / "corrupt.xml.gz"
+    with gzip.open(path, "wb") as f:
+        f.write(b"not xml")
+
+    for streaming in (True, False):
+        with pytest.raises(ValueError) as error:
+            parser.xml_to_df(str(path), streaming=streaming, backend="lxml")
+        pickle.loads(pickle.dumps(error.value))
+
+
+@pytest.fixture
+def multi_article_file(tmp_path):
+    path = tmp_path / "pubmed_multi.xml.gz"
+    with gzip.open(path, "wb") as f:
+        f.write(make_pubmed_xml([str(1000 + i) for i in range(50)]))
+    return str(path)
+
+
+@pytest.mark.parametrize("list_columns", [False, True])
+def test_parallel_matches_sequential(multi_article_file, list_columns):
+    df = parser.xml_to_df(multi_article_file, list_columns=list_columns)
+    assert df.height == 50
+    assert parser.xml_to_df_parallel(multi_article_file, workers=3, list_columns=list_columns).equals(df)
+
+
+@pytest.mark.parametrize("backend", list(parser.BACKENDS))
+def test_parallel_backend(multi_article_file, backend):
+    df = parser.xml_to_df(multi_article_file, backend=backend)
+    assert parser.xml_to_df_parallel(multi_article_file, workers=2, backend=backend).equals(df)
+
+
+def test_parallel_unknown_backend(multi_article_file):
+    with pytest.raises(ValueError):
+        parser.xml_to_df_parallel(multi_article_file, workers=2, backend="unknown")
@@ -0,0 +1,108 @@
+import hashlib
+import subprocess
+import sys
+
+import polars as pl
+import pytest
+
+from pub2csv.pipeline import run_pipeline, stream_file_to_parquet
+from pub2csv.state import update_file_state, get_files_by_status, DOWNLOADED, DONE, FAILED
+
+from .conftest import write_pubmed_file
+
+
+# baseline then updatefiles in the same process, after polars already ran in the parent
+# as get_files_for_pmid does in get_pmid_data
+RUN_TWICE = """
+import sys
+import polars as pl
+from pub2csv.pipeline import run_pipeline
+
+port, output_folder = int(sys.argv[1]), sys.argv[2]
+pl.DataFrame({"PMID": [str(i) for i in range(100000)]}).lazy().sort("PMID").collect()
+for source, n_files in [("baseline", 2), ("updatefiles", 1)]:
+    file_list = [f"pubmed25n{i:04d}.xml.gz" for i in range(1, n_files + 1)]
+    failed = run_pipeline(file_list, "127.0.0.1", f"/pubmed/{source}/", f"{output_folder}/{source}", 2, n_parse=2, port=port)
+    assert failed == [], failed
+"""
+
+
+def test_run_pipeline_twice_after_polars(ftp_server, tmp_path):
+    for source, pmids in [("baseline", [["1", "2"], ["3"]]), ("updatefiles", [["2"]])]:
+        (tmp_path / source).mkdir()
+        for i, file_pmids in enumerate(pmids, 1):
+            write_pubmed_file(ftp_server.root / "pubmed" / source, f"pubmed25n{i:04d}.xml.gz", file_pmids)
+
+    # a deadlocked parsing pool fails the test instead of hanging the suite
+    subprocess.run([sys.executable, "-c", RUN_TWICE, str(ftp_server.port), str(tmp_path)], check=True, timeout=120)
+
+    assert sorted(p.name for p in (tmp_path / "baseline").iterdir()) == ["pubmed25n0001.parquet", "pubmed25n0002.parquet"]
+    assert sorted(p.name for p in (tmp_path / "updatefiles").iterdir()) == ["pubmed25n0001.parquet"]
+    df = pl.read_parquet(tmp_path / "baseline" / "pubmed25n0001.parquet")
+    assert df["PMID"].to_list() == ["1", "2"]
+    assert df.schema["PublicationDate"] == pl.Date
+
+
+def test_resume_parses_verified_downloads(ftp_server, tmp_path):
+    remote = ftp_server.root / "pubmed" / "baseline"
+    output_folder = tmp_path / "baseline"
+    output_folder.mkdir()
+    for i in range(1, 4):
+        write_pubmed_file(remote, f"pubmed25n{i:04d}.xml.gz", [str(i)])
+
+    # an interrupted run left a verified file, and a corrupted one
+    write_pubmed_file(output_folder, "pubmed25n0001.xml.gz", ["1"])
+    write_pubmed_file(output_folder, "pubmed25n0002.xml.gz", ["2"])
+    (output_folder / "pubmed25n0002.xml.gz").write_bytes(b"corrupted")
+
+    state_file = str(tmp_path / "state.sqlite")
+    update_file_state(state_file, "/pubmed/baseline/", "pubmed25n0001.xml.gz", DOWNLOADED)
+    failed = run_pipeline([f"pubmed25n{i:04d}.xml.gz" for i in range(1, 4)], "127.0.0.1", "/pubmed/baseline/", str(output_folder), 2, n_parse=1, state_file=state_file, port=ftp_server.port)
+
+    assert failed == []
+    assert sorted(p.name for p in output_folder.iterdir()) == ["pubmed25n0001.parquet", "pubmed25n0002.parquet", "pubmed25n0003.parquet"]
+    assert pl.read_parquet(output_folder / "pubmed25n0002.parquet")["PMID"].to_list() == ["2"]
+    assert get_files_by_status(state_file, "/pubmed/baseline/", DONE) == ["pubmed25n0001.xml.gz", "pubmed25n0002.xml.gz", "pubmed25n0003.xml.gz"]
+
+    # only the corrupted and the missing files were downloaded
+    assert sorted(name for name, _ in ftp_server.handler.retrieved if name.endswith(".xml.gz")) == ["pubmed25n0002.xml.gz", "pubmed25n0003.xml.gz"]
+
+
+def test_streamed_parquet_matches_downloaded(ftp_server, tmp_path):
+    remote = ftp_server.root / "pubmed" / "baseline"
+    file_list = ["pubmed25n0001.xml.gz", "pubmed25n0002.xml.gz"]
+    write_pubmed_file(remote, file_list[0], [str(i) for i in range(300)])
+    write_pubmed_file(remote, file_list[1], [str(i) for i in range(300, 310)])
+    for folder in ("disk", "stream", "small_blocks"):
+        (tmp_path / folder).mkdir()
+
+    assert run_pipeline(file_list, "127.0.0.1", "/pubmed/baseline/", str(tmp_path / "disk"), 1, n_parse=1, port=ftp_server.port) == []
+    assert run_pipeline(file_list, "127.0.0.1", "/pubmed/baseline/", str(tmp_path / "stream"), 1, n_download=2, stream=True, port=ftp_server.port) == []
+    parquet_file, hash_computed = stream_file_to_parquet("127.0.0.1", "/pubmed/baseline/", file_list[0], str(tmp_path / "small_blocks"), block_size=1024, port=ftp_server.port)
+
+    # nothing but the parquet files is written by the streaming mode
+    assert sorted(p.name for p in (tmp_path / "stream").iterdir()) == ["pubmed25n0001.parquet", "pubmed25n0002.parquet"]
+    for gz_file in file_list:
+        parquet_name = gz_file.replace(".xml.gz", ".parquet")
+        assert pl.read_parquet(tmp_path / "stream" / parquet_name).equals(pl.read_parquet(tmp_path / "disk" / parquet_name))
+    assert pl.read_parquet(parquet_file).equals(pl.read_parquet(tmp_path / "disk" / "pubmed25n0001.parquet"))
+    assert hash_computed == hashlib.md5((remote / file_list[0]).read_bytes()).hexdigest()
+
+
+def test_streamed_md5_mismatch_writes_nothing(ftp_server, tmp_path):
+    write_pubmed_file(ftp_server.root / "pubmed" / "baseline", "pubmed25n0001.xml.gz", ["1", "2"], md5="0" * 32)
+
+    with pytest.raises(ValueError, match="md5 mismatch"):
+        stream_file_to_parquet("127.0.0.1", "/pubmed/baseline/", "pubmed25n0001.xml.gz", str(tmp_path), port=ftp_server.port)
+    assert [p.name for p in tmp_path.iterdir() if p.name != "remote"] == []
+
+    # the streaming pipeline retries, then reports the file
+    state_file = str(tmp_path / "state.sqlite")
+    output_folder = tmp_path / "stream"
+    output_folder.mkdir()
+    failed = run_pipeline(["pubmed25n0001.xml.gz"], "127.0.0.1", "/pubmed/baseline/", str(output_folder), 2, stream=True, state_file=state_file, port=ftp_server.port)
+    assert failed == ["pubmed25n0001.xml.gz"]
+    assert list(output_folder.iterdir()) == []
+    assert get_files_by_status(state_file, "/pubmed/baseline/", FAILED) == ["pubmed25n0001.xml.gz"]
+    # one transfer for the direct call, then max_retries for the pipeline
+    assert [name for name, _ in ftp_server.handler.retrieved].count("pubmed25n0001.xml.gz") == 3
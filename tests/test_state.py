@@ -0,0 +1,84 @@
+import sqlite3
+
+import pytest
+
+from pub2csv.state import sync_state, get_work_set, get_files_by_status, update_file_state, DONE, DOWNLOADED, PENDING
+
+
+FOLDER = "/pubmed/baseline/"
+MANIFEST = {f"pubmed25n{i:04d}.xml.gz": {"size": 1000 + i} for i in range(1, 4)}
+
+
+@pytest.fixture
+def output_folder(tmp_path):
+    folder = tmp_path / "output"
+    folder.mkdir()
+    return folder
+
+
+def read_state(db_file, name):
+    connection = sqlite3.connect(db_file)
+    connection.row_factory = sqlite3.Row
+    row = connection.execute("SELECT * FROM files WHERE folder = ? AND name = ?", [FOLDER, name]).fetchone()
+    connection.close()
+    return dict(row)
+
+
+def test_new_files_are_pending(tmp_path, output_folder):
+    db_file = str(tmp_path / "state.sqlite")
+    sync_state(db_file, FOLDER, MANIFEST, str(output_folder))
+    assert get_work_set(db_file, FOLDER) == sorted(MANIFEST)
+    assert get_files_by_status(db_file, FOLDER, PENDING) == sorted(MANIFEST)
+    assert read_state(db_file, "pubmed25n0002.xml.gz")["size"] == 1002
+
+
+def test_existing_parquet_is_adopted(tmp_path, output_folder):
+    db_file = str(tmp_path / "state.sqlite")
+    (output_folder / "pubmed25n0002.parquet").write_bytes(b"")
+    sync_state(db_file, FOLDER, MANIFEST, str(output_folder))
+
+    assert get_work_set(db_file, FOLDER) == ["pubmed25n0001.xml.gz", "pubmed25n0003.xml.gz"]
+    state = read_state(db_file, "pubmed25n0002.xml.gz")
+    assert state["status"] == DONE
+    assert state["parquet_path"] == f"{output_folder}/pubmed25n0002.parquet"
+
+
+def test_size_change_goes_back_to_pending(tmp_path, output_folder):
+    db_file = str(tmp_path / "state.sqlite")
+    sync_state(db_file, FOLDER, MANIFEST, str(output_folder))
+    for name in MANIFEST:
+        (output_folder / name.replace(".xml.gz", ".parquet")).write_bytes(b"")
+        update_file_state(db_file, FOLDER, name, DONE, parquet_path=str(output_folder / name.replace(".xml.gz", ".parquet")))
+    assert get_work_set(db_file, FOLDER) == []
+
+    # same listing, nothing to do
+    sync_state(db_file, FOLDER, MANIFEST, str(output_folder))
+    assert get_work_set(db_file, FOLDER) == []
+
+    # file republished on the server
+    manifest = dict(MANIFEST, **{"pubmed25n0003.xml.gz": {"size": 5000}})
+    sync_state(db_file, FOLDER, manifest, str(output_folder))
+    assert get_work_set(db_file, FOLDER) == ["pubmed25n0003.xml.gz"]
+    assert read_state(db_file, "pubmed25n0003.xml.gz")["size"] == 5000
+
+
+def test_deleted_parquet_goes_back_to_pending(tmp_path, output_folder):
+    db_file = str(tmp_path / "state.sqlite")
+    sync_state(db_file, FOLDER, MANIFEST, str(output_folder))
+    for name in MANIFEST:
+        (output_folder / name.replace(".xml.gz", ".parquet")).write_bytes(b"")
+        update_file_state(db_file, FOLDER, name, DONE, parquet_path=str(output_folder / name.replace(".xml.gz", ".parquet")))
+
+    (output_folder / "pubmed25n0001.parquet").unlink()
+    sync_state(db_file, FOLDER, MANIFEST, str(output_folder))
+    assert get_work_set(db_file, FOLDER) == ["pubmed25n0001.xml.gz"]
+    assert read_state(db_file, "pubmed25n0001.xml.gz")["status"] == PENDING
+
+
+def test_downloaded_files_stay_in_work_set(tmp_path, output_folder):
+    db_file = str(tmp_path / "state.sqlite")
+    sync_state(db_file, FOLDER, MANIFEST, str(output_folder))
+    update_file_state(db_file, FOLDER, "pubmed25n0001.xml.gz", DOWNLOADED, md5="abc")
+    sync_state(db_file, FOLDER, MANIFEST, str(output_folder))
+    assert get_work_set(db_file, FOLDER) == sorted(MANIFEST)
+    assert read_state(db_file, "pubmed25n0001.xml.gz")["status"] == DOWNLOADED